@@ -15,8 +15,13 @@ from ragcore.utils import query_type_map, data_source_map
 # - Azure AI Search
 # - Cosmos
 
+# Execution Modes, how the results of the search intents are chunked:
+# - serial
+# - thread
+# - process
+
 @tool
-def chunk_documents(results: List[List[Dict[str, Any]]], max_tokens: int, queries: List, top_k: int, data_source: str, query_type: str) -> List:
+def chunk_documents(results: List[List[Dict[str, Any]]], max_tokens: int, queries: List, top_k: int, data_source: str, query_type: str, execution_mode: str = "serial") -> List:
   # Check if Query Type is valid
   if query_type not in query_type_map:
     raise Exception(f"Invalid Query Type: {query_type}")
@@ -26,4 +31,4 @@ def chunk_documents(results: List[List[Dict[str, Any]]], max_tokens: int, querie
     raise Exception(f"Invalid Data Source: {data_source}")
   transformed_results = transform_retrieval_response(results, queries)
   
-  return chunk_documents_core(transformed_results, max_tokens, top_k, data_source_map[data_source], query_type_map[query_type])
\ No newline at end of file
+  return chunk_documents_core(transformed_results, max_tokens, top_k, data_source_map[data_source], query_type_map[query_type], execution_mode=execution_mode)
\ No newline at end of file
@@ -1,5 +1,10 @@
 from typing import List, Dict, Any
 
+# Metadata fields passed on to the chunkers. The embedding vector (contentVector) is not, as the
+# chunkers never read it and it is the bulk of every retrieved document.
+METADATA_FIELDS_WITH_DEFAULT = ('id', 'title', 'url', 'filepath')
+METADATA_FIELDS = ('meta_json_string', '@search.score', '@search.reranker_score', '@search.highlights', '@search.captions', 'captions', 'answers')
+
 def transform_retrieval_response(retrieval_responses: List[List[Dict[str, Any]]], queries: List) -> List[Dict[str, Any]]:
     transformed_retrieval_responses = list()
     for query, query_retrieval_responses in zip(queries, retrieval_responses):
@@ -21,18 +26,10 @@ def transform_raw_retrieval_doc(raw_doc: Dict[str, Any]) -> Dict[str, Any]:
     elif 'metadata' in raw_doc:
         field_to_extract_metadata_from = raw_doc['metadata'] 
     if field_to_extract_metadata_from:
-        transformed_metadata['id'] = field_to_extract_metadata_from.get('id', '')
-        transformed_metadata['title'] = field_to_extract_metadata_from.get('title', '')
-        transformed_metadata['url'] = field_to_extract_metadata_from.get('url', '')
-        transformed_metadata['filepath'] = field_to_extract_metadata_from.get('filepath', '')
-        transformed_metadata['contentVector'] = field_to_extract_metadata_from.get('contentVector')
-        transformed_metadata['meta_json_string'] = field_to_extract_metadata_from.get('meta_json_string')
-        transformed_metadata['@search.score'] = field_to_extract_metadata_from.get('@search.score')
-        transformed_metadata['@search.reranker_score'] = field_to_extract_metadata_from.get('@search.reranker_score')
-        transformed_metadata['@search.highlights'] = field_to_extract_metadata_from.get('@search.highlights')
-        transformed_metadata['@search.captions'] = field_to_extract_metadata_from.get('@search.captions')
-        transformed_metadata['captions'] = field_to_extract_metadata_from.get('captions')
-        transformed_metadata['answers'] = field_to_extract_metadata_from.get('answers')
+        for field in METADATA_FIELDS_WITH_DEFAULT:
+            transformed_metadata[field] = field_to_extract_metadata_from.get(field, '')
+        for field in METADATA_FIELDS:
+            transformed_metadata[field] = field_to_extract_metadata_from.get(field)
 
     transformed_doc['metadata'] = transformed_metadata
     return transformed_doc
@@ -0,0 +1,28 @@
+from promptflow import tool
+from promptflow.connections import AzureOpenAIConnection
+from typing import List
+from ragcore.queryLocalIndex import query_local_index_core
+from ragcore.retrieval.hybrid import KEYWORD_QUERY_TYPES
+from ragcore.utils import query_type_map
+
+# Drop-in replacement of querySearchResource backed by a local search index, built with
+# ragcore.retrieval.LocalSearchIndex from the chunks or the documents of the search index.
+# For vector and hybrid query types, the queries are embedded with the embedding deployment
+# the index was built with.
+
+@tool
+def query_local_index(queries: List, index_path: str, top_k: int, query_type: str, connection: AzureOpenAIConnection = None, embedding_deployment: str = None) -> List:
+  # Check if Query Type is valid
+  if query_type not in query_type_map:
+    raise Exception(f"Invalid Query Type: {query_type}")
+  if not queries:
+    return []
+
+  query_vectors = None
+  if query_type_map[query_type] not in KEYWORD_QUERY_TYPES:
+    from openai import AzureOpenAI
+    client = AzureOpenAI(api_key=connection.api_key, api_version=connection.api_version, azure_endpoint=connection.api_base)
+    response = client.embeddings.create(input=queries, model=embedding_deployment)
+    query_vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+  return query_local_index_core(queries, index_path, top_k, query_type_map[query_type], query_vectors=query_vectors)
@@ -0,0 +1,68 @@
+"""Latency of chunk_documents_core per execution mode.
+
+Chunks synthetic Azure AI Search results of several search intents serially, on a thread pool
+and on a process pool, checks that all modes return the same chunks and reports the median
+latency. The pools are created before timing, as they are shared across requests.
+
+Usage:
+    python -m ragcore.benchmarks.chunk_documents [--queries 4] [--docs 8] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from ragcore.chunkDocuments import chunk_documents_core
+from ragcore.datamodels.enums import ExecutionMode, QueryType
+
+WORDS = "the hotel offers rooms with a view of the sea and breakfast is served daily from seven to ten".split()
+
+def make_results(num_queries: int, num_docs: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "query": " ".join(rng.choices(WORDS, k=6)),
+            "top_k": [
+                {
+                    "text": " ".join(rng.choices(WORDS, k=rng.randint(200, 2000))),
+                    "score": rng.random(),
+                    "metadata": {"id": str(i), "title": f"title {i}", "filepath": f"doc{i}.md", "@search.score": rng.random()},
+                }
+                for i in range(num_docs)
+            ],
+        }
+        for _ in range(num_queries)
+    ]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = make_results(args.queries, args.docs)
+    expected = None
+    print(f"{'mode':<10}{'median':>12}")
+    for mode in ExecutionMode:
+        timings = []
+        for i in range(args.repeat + 1):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                chunks = chunk_documents_core(
+                    results, args.max_tokens, 5, "acs", QueryType.VECTOR_SIMPLE_HYBRID.value, execution_mode=mode.value)
+                elapsed = time.perf_counter() - start
+            # the first run starts the pool and fills the caches
+            if i:
+                timings.append(elapsed)
+        if expected is None:
+            expected = chunks
+        assert chunks == expected, f"{mode.value} returned different chunks"
+        print(f"{mode.value:<10}{statistics.median(timings) * 1000:>10.1f}ms")
+
+if __name__ == "__main__":
+    main()
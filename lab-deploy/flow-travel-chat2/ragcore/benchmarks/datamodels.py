@@ -0,0 +1,71 @@
+"""Memory and conversion benchmark of the slotted datamodels.
+
+Compares Document, SearchResultsACS and SearchResultsCosmosVector with regular (__dict__ based)
+dataclasses with the same fields, and dataclass_to_dict / dataclass_from_dict with the
+fields() reflection based conversion they replace.
+
+Usage:
+    python -m ragcore.benchmarks.datamodels [--objects 10000]
+"""
+import argparse
+import timeit
+import tracemalloc
+from dataclasses import dataclass, fields, make_dataclass
+from typing import Any, Callable, Dict, List
+
+from ragcore.datamodels import Document, dataclass_from_dict, dataclass_to_dict
+from ragcore.datamodels.search_results_acs import Metadata, SearchResultsACS
+from ragcore.datamodels.search_results_cosmos_vector import SearchResultsCosmosVector
+
+def unslotted(cls: type) -> type:
+    """Regular dataclass with the same fields as cls."""
+    return make_dataclass(f"Unslotted{cls.__name__}", [(field.name, field.type, field) for field in fields(cls)])
+
+def reflection_to_dict(obj: dataclass) -> Dict[str, Any]:
+    return {field.name: getattr(obj, field.name) for field in fields(obj)}
+
+def bytes_per_object(factory: Callable[[int], Any], num_objects: int) -> float:
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(num_objects)]
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, "filename"))
+    tracemalloc.stop()
+    del objects
+    # the list itself holds one pointer per object
+    return used / num_objects - 8
+
+def per_second(func: Callable[[], Any], num_objects: int) -> float:
+    number = 5
+    return number * num_objects / timeit.timeit(func, number=number)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=10000)
+    args = parser.parse_args()
+
+    # field values are shared between objects, only the objects themselves are measured
+    content = "content " * 100
+    metadata = {"chunking": "orig"}
+    factories: Dict[type, Callable[[type], Callable[[int], Any]]] = {
+        Document: lambda cls: lambda i: cls(content=content, chunk_id=i, score=0.5, title="title", filepath="a.md", metadata=metadata),
+        SearchResultsACS: lambda cls: lambda i: cls(metadata=None, score=0.5, text=content),
+        Metadata: lambda cls: lambda i: cls(search_score=0.5, filepath="a.md", chunk_id=i, title="title"),
+        SearchResultsCosmosVector: lambda cls: lambda i: cls(chunk_id=i, id=i, title="title", content=content, filepath="a.md"),
+    }
+
+    print(f"{'model':<28}{'bytes/object':>14}{'unslotted':>12}{'to_dict/s':>14}{'fields()/s':>14}{'from_dict/s':>14}{'cls(**d)/s':>14}")
+    for cls, factory in factories.items():
+        objects: List[Any] = [factory(cls)(i) for i in range(args.objects)]
+        dicts = [dataclass_to_dict(obj) for obj in objects]
+        print(
+            f"{cls.__name__:<28}"
+            f"{bytes_per_object(factory(cls), args.objects):>14.0f}"
+            f"{bytes_per_object(factory(unslotted(cls)), args.objects):>12.0f}"
+            f"{per_second(lambda: [dataclass_to_dict(obj) for obj in objects], args.objects):>14,.0f}"
+            f"{per_second(lambda: [reflection_to_dict(obj) for obj in objects], args.objects):>14,.0f}"
+            f"{per_second(lambda: [dataclass_from_dict(cls, d) for d in dicts], args.objects):>14,.0f}"
+            f"{per_second(lambda: [cls(**d) for d in dicts], args.objects):>14,.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
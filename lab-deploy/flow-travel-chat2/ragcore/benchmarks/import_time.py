@@ -0,0 +1,88 @@
+"""Cold start import time of the promptflow nodes.
+
+Every node of the flow is imported in a fresh interpreter, as on a container cold start, and
+the median wall time over the runs is reported together with the heavy dependencies the import
+pulled in. The ragcore imports of each node are also timed on their own, so the benchmark is
+still meaningful where promptflow itself is not installed.
+
+Usage:
+    python -m ragcore.benchmarks.import_time [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+FLOW_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HEAVY_MODULES = ("numpy", "pandas", "scipy", "sklearn", "langdetect", "bs4", "markdown", "tiktoken", "tqdm")
+
+CHILD_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+{statements}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(name for name in {heavy_modules!r} if name in sys.modules))
+"""
+
+def node_files() -> List[str]:
+    """Python tools of the flow, i.e. the files that define a promptflow @tool."""
+    files = []
+    for name in sorted(os.listdir(FLOW_DIR)):
+        if name.endswith(".py"):
+            with open(os.path.join(FLOW_DIR, name), encoding="utf-8") as f:
+                if "from promptflow import tool" in f.read():
+                    files.append(name)
+    return files
+
+def ragcore_imports(file_name: str) -> List[str]:
+    with open(os.path.join(FLOW_DIR, file_name), encoding="utf-8") as f:
+        return [line.strip() for line in f if line.startswith(("from ragcore", "import ragcore"))]
+
+def time_import(statements: List[str]) -> Tuple[Optional[float], str]:
+    """Runs the import statements in a fresh interpreter. Returns the elapsed seconds, or None
+    and the error if the import failed, and the heavy modules that ended up loaded."""
+    script = CHILD_SCRIPT.format(statements="\n".join(statements) or "pass", heavy_modules=HEAVY_MODULES)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [FLOW_DIR, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script], cwd=FLOW_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return None, error[-1] if error else f"exit code {result.returncode}"
+    elapsed, modules = (result.stdout.splitlines() + [""])[:2]
+    return float(elapsed), modules
+
+def median_import_time(statements: List[str], repeat: int) -> Tuple[Optional[float], str]:
+    # the first run writes the bytecode caches
+    time_import(statements)
+    timings, modules = [], ""
+    for _ in range(repeat):
+        elapsed, modules = time_import(statements)
+        if elapsed is None:
+            return None, modules
+        timings.append(elapsed)
+    return statistics.median(timings), modules
+
+def format_result(elapsed: Optional[float], modules: str) -> str:
+    if elapsed is None:
+        return f"{'failed':>10}  {modules}"
+    return f"{elapsed * 1000:>8.1f}ms  {modules or '-'}"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for file_name in node_files():
+        module_name = file_name[:-len(".py")]
+        print(f"{module_name}")
+        statements = ragcore_imports(file_name)
+        if statements:
+            print(f"  {'ragcore imports':<16}{format_result(*median_import_time(statements, args.repeat))}")
+        print(f"  {'node':<16}{format_result(*median_import_time([f'import {module_name}'], args.repeat))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Build, load and query latency of the local search index.
+
+Builds a LocalSearchIndex over synthetic chunks with random embeddings, saves it, and reports
+its size on disk, the time LocalSearchIndex.load and BM25Index.load take and the per-query latency
+of keyword (BM25), vector and hybrid (reciprocal rank fusion) queries.
+
+Usage:
+    python -m ragcore.benchmarks.local_search [--documents 50000] [--dimension 1536] [--nlist 0]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from ragcore.retrieval import BM25Index, LocalSearchIndex
+
+WORDS = ("hotel beach resort museum tour flight price breakfast pool spa view sea city night "
+         "family room suite airport transfer dinner guide park bridge tower market river").split()
+
+def median_ms(func: Callable[[], object], repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF clusters of the vector index, 0 for exhaustive search")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vectors = np.random.default_rng(0).standard_normal((args.documents + args.queries, args.dimension)).astype(np.float32)
+    documents = (
+        {"id": str(i), "title": f"{rng.choice(WORDS)} {i}", "content": " ".join(rng.choices(WORDS, k=rng.randint(50, 300))),
+         "filepath": f"doc{i}.md", "contentVector": vectors[i]}
+        for i in range(args.documents)
+    )
+    queries = [" ".join(rng.choices(WORDS, k=4)) for _ in range(args.queries)]
+    query_vectors = vectors[args.documents:].tolist()
+
+    start = time.perf_counter()
+    index = LocalSearchIndex.from_documents(documents, ivf_nlist=args.nlist or None)
+    print(f"build, {args.documents} documents: {time.perf_counter() - start:.1f}s")
+    with tempfile.TemporaryDirectory() as path:
+        index.save(path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        bm25_size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith("bm25"))
+        print(f"size on disk: {size / 2 ** 20:.1f}MiB, of which BM25 {bm25_size / 2 ** 20:.1f}MiB")
+        print(f"load: {median_ms(lambda: LocalSearchIndex.load(path)):.1f}ms, of which BM25 {median_ms(lambda: BM25Index.load(path)):.1f}ms")
+
+        index = LocalSearchIndex.load(path)
+        print(f"\n{'query type':<24}{'ms/query':>10}")
+        for query_type in ("simple", "vector", "vector_simple_hybrid"):
+            elapsed = median_ms(lambda: [index.search([query], query_type, args.top_k, query_vectors=[vector])
+                                         for query, vector in zip(queries, query_vectors)])
+            print(f"{query_type:<24}{elapsed / len(queries):>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Scaling of PdfChunker with the size of a table.
+
+Chunks a synthetic Form Recognizer page, a heading, some text and a price table with a header
+row on a single line as Form Recognizer renders it, for growing numbers of rows. Splitting a
+table is linear in its size, so the time per row should stay flat as the table grows.
+
+Usage:
+    python -m ragcore.benchmarks.pdf_chunker [--rows 500 2000 8000] [--token-limit 512]
+"""
+import argparse
+import random
+import time
+
+from ragcore.chunking import PdfChunker
+
+WORDS = "the hotel offers rooms with a view of the sea and breakfast is served daily from seven to ten".split()
+
+def make_page(num_rows: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    rows = "".join(
+        f"<tr><td>{' '.join(rng.choices(WORDS, k=3))}</td><td>{rng.randint(50, 900)}</td><td>{rng.randint(1, 14)}</td></tr>"
+        for _ in range(num_rows))
+    text = " ".join(rng.choices(WORDS, k=40)) + "."
+    return (f"<h1>Brochure</h1>{text}<h2>Prices</h2>{text}"
+            f"<table><tr><th>Hotel</th><th>Price</th><th>Nights</th></tr>{rows}</table>{text}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--token-limit", type=int, default=512)
+    args = parser.parse_args()
+
+    chunker = PdfChunker()
+    # the first run builds the encoding
+    chunker.split_text(make_page(10), token_limit=args.token_limit)
+    print(f"{'rows':>8}{'chunks':>8}{'time':>12}{'per row':>12}")
+    for num_rows in args.rows:
+        page = make_page(num_rows)
+        start = time.perf_counter()
+        chunks = chunker.split_text(page, token_limit=args.token_limit)
+        elapsed = time.perf_counter() - start
+        print(f"{num_rows:>8}{len(chunks):>8}{elapsed * 1000:>10.1f}ms{elapsed / num_rows * 1e6:>10.1f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Parsing of Azure AI Search results into SearchResultsACS.
+
+Times result_to_dataclass on synthetic results that carry a 1536-float embedding vector in
+their metadata, against normalizing the field names of the whole result with
+normalize_content_fields before reading it.
+
+Usage:
+    python -m ragcore.benchmarks.result_parsing [--results 20000] [--dimension 1536]
+"""
+import argparse
+import random
+import timeit
+from typing import Any, Dict, List
+
+from ragcore.chunking.search_chunkers.acs_utils import normalize_content_fields, result_to_dataclass
+
+def make_results(num_results: int, dimension: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    vector = [rng.random() for _ in range(dimension)]
+    return [
+        {
+            "text": f"Title: hotel {i}\nrooms with a view of the sea",
+            "score": rng.random(),
+            "metadata": {
+                "id": str(i), "title": "", "uri": f"https://example.com/{i}", "filename": f"doc{i}.md",
+                "contentVector": list(vector), "meta_json_string": "{}",
+                "@search.score": rng.random(), "@search.reranker_score": None, "@search.highlights": None,
+            },
+        }
+        for i in range(num_results)
+    ]
+
+def normalize_then_parse(result: Dict[str, Any]) -> Any:
+    return result_to_dataclass(normalize_content_fields(result))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    args = parser.parse_args()
+
+    results = make_results(args.results, args.dimension)
+    assert [normalize_then_parse(result) for result in results[:100]] == [result_to_dataclass(result) for result in results[:100]]
+    print(f"{'parser':<24}{'results/s':>14}")
+    for name, parse in (("result_to_dataclass", result_to_dataclass), ("normalize, then parse", normalize_then_parse)):
+        seconds = min(timeit.repeat(lambda: [parse(result) for result in results], number=1, repeat=3))
+        print(f"{name:<24}{args.results / seconds:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Parity and speed benchmark of the character based similarity methods used by
+get_tfidf_sim_scores for short queries and for zh/ja/ko/th/vi.
+
+Usage:
+    python -m ragcore.benchmarks.sequence_similarity [--queries 20] [--docs 20] [--doc-chars 1500]
+"""
+import argparse
+import itertools
+import random
+import time
+from typing import List
+
+import numpy as np
+from scipy.stats import spearmanr
+
+from ragcore.utils import CharNgramSimilarity, sequence_match_ratio
+
+# Synthetic text: words of 1 to 3 CJK characters, with Zipf distributed character and word
+# frequencies, close to the statistics of real Chinese text.
+NUM_CHARS = 3000
+NUM_WORDS = 5000
+
+def zipf_weights(n: int) -> List[float]:
+    return list(itertools.accumulate(1.0 / rank for rank in range(1, n + 1)))
+
+def make_words(rng: random.Random, num_words: int) -> List[str]:
+    chars = [chr(0x4E00 + i) for i in range(NUM_CHARS)]
+    char_weights = zipf_weights(NUM_CHARS)
+    return ["".join(rng.choices(chars, cum_weights=char_weights, k=rng.randint(1, 3))) for _ in range(num_words)]
+
+def make_text(rng: random.Random, words: List[str], num_chars: int) -> str:
+    word_weights = zipf_weights(len(words))
+    text = []
+    length = 0
+    while length < num_chars:
+        word = rng.choices(words, cum_weights=word_weights)[0]
+        text.append(word)
+        length += len(word)
+    return "".join(text)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--doc-chars", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ngram-range", type=int, nargs=2, default=[1, 2])
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(rng, NUM_WORDS)
+    documents = [make_text(rng, words, args.doc_chars) for _ in range(args.docs)]
+    # half of the queries are taken from the documents, the other half are random
+    queries = [
+        rng.choice(documents)[:rng.randint(4, 12)] if i % 2 == 0 else make_text(rng, words, rng.randint(4, 12))
+        for i in range(args.queries)
+    ]
+
+    t0 = time.perf_counter()
+    reference = np.array([[sequence_match_ratio(query, doc) for doc in documents] for query in queries])
+    sequence_match_time = time.perf_counter() - t0
+
+    similarity = CharNgramSimilarity(ngram_range=tuple(args.ngram_range))
+    t0 = time.perf_counter()
+    scores = np.array([similarity.score(query, documents) for query in queries])
+    char_ngram_time = time.perf_counter() - t0
+
+    rank_correlations = [spearmanr(ref_row, row)[0] for ref_row, row in zip(reference, scores)]
+    top1_agreement = np.mean(reference.argmax(axis=1) == scores.argmax(axis=1))
+    print(f"{args.queries} queries x {args.docs} documents of {args.doc_chars} characters")
+    print(f"sequence_match: {sequence_match_time*1000:.1f}ms")
+    print(f"char_ngram:     {char_ngram_time*1000:.1f}ms ({sequence_match_time/char_ngram_time:.1f}x)")
+    print(f"mean absolute score difference: {np.abs(reference - scores).mean():.3f}")
+    print(f"mean Spearman rank correlation: {np.nanmean(rank_correlations):.3f}")
+    print(f"top-1 agreement: {top1_agreement:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark of the TOKENIZERS registry.
+
+Reports the cost of building the encodings, batch token counting with count_many against one
+encode call per text, and the private memory of forked worker processes, with the encodings
+either warmed up in the parent before forking or built by every worker on its own. The memory
+comparison reads /proc/self/smaps_rollup and therefore only runs on Linux.
+
+Usage:
+    python -m ragcore.benchmarks.tokenizers [--texts 5000] [--workers 4]
+"""
+import argparse
+import os
+import random
+import time
+from typing import Callable, List, Optional
+
+from ragcore.utils import TOKENIZERS, TokenCountCache
+
+WORDS = "the hotel offers rooms with a view of the sea and breakfast is served daily from seven to ten".split()
+
+def make_texts(num_texts: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(20, 400))) for _ in range(num_texts)]
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def private_kib() -> Optional[int]:
+    """Private (not shared with other processes) memory of this process in KiB."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return sum(int(fields[name].split()[0]) for name in ("Private_Clean", "Private_Dirty") if name in fields)
+
+def forked_worker_private_kib(num_workers: int) -> List[int]:
+    """Private memory of workers forked from this process, after each counted some tokens."""
+    results = []
+    for _ in range(num_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            TOKENIZERS.warmup()
+            TOKENIZERS.count_many(make_texts(200), "cl100k_base")
+            os.write(write_fd, str(private_kib() or 0).encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            results.append(int(pipe.read() or 0))
+        os.waitpid(pid, 0)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    # workers are forked before the parent builds any encoding, then after it warmed them up
+    worker_kib = {}
+    if private_kib() is not None and hasattr(os, "fork"):
+        worker_kib["built in every worker"] = forked_worker_private_kib(args.workers)
+
+    for encoding_name in TOKENIZERS.DEFAULT_ENCODINGS:
+        start = time.perf_counter()
+        TOKENIZERS.warmup((encoding_name,))
+        print(f"warmup {encoding_name:<14}{(time.perf_counter() - start) * 1000:>10.1f}ms")
+
+    texts = make_texts(args.texts)
+    encoding = TOKENIZERS.get("cl100k_base")
+    print(f"\ncounting {len(texts)} texts, {TOKENIZERS.num_threads} threads")
+    timings = {
+        "encode per text": best_of(lambda: [len(encoding.encode(text)) for text in texts]),
+        "count_many": best_of(lambda: TOKENIZERS.count_many(texts, "cl100k_base")),
+        "count_many, cold cache": best_of(lambda: TOKENIZERS.count_many(texts, "cl100k_base", cache=TokenCountCache())),
+    }
+    warm_cache = TokenCountCache()
+    TOKENIZERS.count_many(texts, "cl100k_base", cache=warm_cache)
+    timings["count_many, warm cache"] = best_of(lambda: TOKENIZERS.count_many(texts, "cl100k_base", cache=warm_cache))
+    for name, seconds in timings.items():
+        print(f"{name:<24}{seconds * 1000:>10.1f}ms")
+
+    if not worker_kib:
+        print("\nworker memory: needs Linux")
+        return
+    worker_kib["warmed up before fork"] = forked_worker_private_kib(args.workers)
+    print(f"\nprivate memory per forked worker, {args.workers} workers")
+    for name, kib in worker_kib.items():
+        print(f"{name:<24}{sum(kib) / len(kib) / 1024:>10.1f}MiB")
+
+if __name__ == "__main__":
+    main()
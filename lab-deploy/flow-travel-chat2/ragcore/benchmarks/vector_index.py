@@ -0,0 +1,63 @@
+"""Latency and recall of the local vector index.
+
+Builds a LocalVectorIndex over random clustered embeddings, saves and memory-maps it, and
+reports the per-query latency of the exhaustive search and of the IVF search for a few nprobe
+values, with the recall of the IVF top_k against the exhaustive top_k.
+
+Usage:
+    python -m ragcore.benchmarks.vector_index [--documents 50000] [--dimension 1536] [--nlist 256]
+"""
+import argparse
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from ragcore.retrieval import LocalVectorIndex
+
+def make_embeddings(num_rows: int, dimension: int, num_topics: int = 64, seed: int = 0) -> np.ndarray:
+    """Embeddings around a few topic directions, as chunks of a corpus tend to be."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_topics, dimension)).astype(np.float32)
+    return topics[rng.integers(num_topics, size=num_rows)] + 0.5 * rng.standard_normal((num_rows, dimension)).astype(np.float32)
+
+def median_ms(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(args.documents + args.queries, args.dimension)
+    queries: List[List[float]] = embeddings[args.documents:].tolist()
+    documents = ({"id": str(i), "content": f"chunk {i}", "contentVector": vector} for i, vector in enumerate(embeddings[:args.documents]))
+    start = time.perf_counter()
+    index = LocalVectorIndex.from_documents(documents, ivf_nlist=args.nlist)
+    print(f"build, {args.documents} documents, nlist {args.nlist}: {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as path:
+        index.save(path)
+        index = LocalVectorIndex.load(path)
+        expected = [{row for row, _ in result} for result in index.search(queries, args.top_k, exhaustive=True)]
+        print(f"\n{'search':<16}{'ms/query':>10}{'recall':>10}")
+        elapsed = median_ms(lambda: [index.search([query], args.top_k, exhaustive=True) for query in queries], 3)
+        print(f"{'exhaustive':<16}{elapsed / len(queries):>10.3f}{1:>10.3f}")
+        for nprobe in (1, 4, 16, 64):
+            results = index.search(queries, args.top_k, nprobe=nprobe)
+            recall = np.mean([len(expected_rows & {row for row, _ in result}) / args.top_k for expected_rows, result in zip(expected, results)])
+            elapsed = median_ms(lambda: [index.search([query], args.top_k, nprobe=nprobe) for query in queries], 3)
+            print(f"{f'ivf nprobe={nprobe}':<16}{elapsed / len(queries):>10.3f}{recall:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ragcore.datamodels.document import Document
-from ragcore.datamodels.enums import QueryType
+from ragcore.datamodels.enums import ExecutionMode, QueryType
 from ragcore.datamodels.search_result import SearchResult
 from ragcore.chunking.search_chunkers.acs_utils import result_to_dataclass
 from ragcore.chunking.search_chunkers.cosmos_chunker import CosmosChunker
@@ -34,7 +34,8 @@ def parse_results(results: List[Dict[str, Any]], data_source_type: DataSourceTyp
     search_results.append(search_result)
   return search_results
 
-def chunk_documents_core(results: List[Dict[str, Any]], max_tokens: int, top_k: int, data_source_type: DataSourceType, query_type: QueryType) -> List[List[Dict[str, Any]]]:
+def chunk_documents_core(results: List[Dict[str, Any]], max_tokens: int, top_k: int, data_source_type: DataSourceType, query_type: QueryType,
+                         execution_mode: str = ExecutionMode.SERIAL.value, max_workers: Optional[int] = None) -> List[List[Dict[str, Any]]]:
   """
   Chunk retrieved documents.
   @param result: List of retrieved documents
@@ -43,10 +44,13 @@ def chunk_documents_core(results: List[Dict[str, Any]], max_tokens: int, top_k:
   @param top_k: number of search results
   @param data_source_type: Value can be "acs" or "cosmos"
   @param query_type: Value can be "simple", "semantic", "vector", "vector_simple_hybrid" or "vector_semantic_hybrid"
+  @param execution_mode: Value can be "serial", "thread" or "process", how the results of the queries are chunked.
+                         Every mode returns the same chunks in the same order.
+  @param max_workers: Number of threads or processes for the "thread" and "process" modes, defaults to the pool's default
 
   @return: List of normalized documents
   """
-  chunker = ChunkerFactory.create_chunker(data_source_type, query_type)
+  chunker = ChunkerFactory.create_chunker(data_source_type, query_type, execution_mode=execution_mode, max_workers=max_workers)
   parsed_results: List[SearchResult] = parse_results(results, data_source_type)
   
   chunked_documents: List[List[Document]] = chunker.chunk_results(results=parsed_results, max_tokens=max_tokens, top_k=top_k)
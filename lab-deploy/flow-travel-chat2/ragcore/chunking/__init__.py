@@ -1 +1 @@
-from ragcore.chunking.custom_chunker import MarkdownTextSplitter, PdfChunker, CSVChunker, PythonCodeTextSplitter, RecursiveCharacterTextSplitter
\ No newline at end of file
+from ragcore.chunking.custom_chunker import MarkdownTextSplitter, PdfChunker, CSVChunker, PythonCodeTextSplitter, RecursiveCharacterTextSplitter, TokenOffsetTextSplitter
\ No newline at end of file
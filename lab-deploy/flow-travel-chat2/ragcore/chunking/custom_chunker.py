@@ -1,3 +1,5 @@
+from __future__ import annotations
+import bisect
 import io
 import math
 import os
@@ -5,12 +7,13 @@ import re
 from abc import ABC, abstractmethod
 from typing import Any, Tuple, Union, Dict, Generator, Iterable, List, Optional
 
-import numpy as np
-import pandas as pd
-
 from ragcore.datamodels.document import Document
+from ragcore.lazy import LazyModule
 from ragcore.utils import TokenEstimator
 
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
 class CustomChunker(ABC):
 
     @abstractmethod
@@ -18,22 +21,73 @@ class CustomChunker(ABC):
         "split text into documents"
 
 class CSVChunker(CustomChunker):
+    def __init__(self, columnar: bool = True):
+        """Initializes the CSV chunker.
+        Args:
+            columnar (bool): If true, rows are rendered, counted and summarized column-wise in a few
+                vectorized passes instead of row by row. Both modes produce identical documents.
+        """
+        self.columnar = columnar
+
     def split_text(self, text: str, filename: str, token_limit: int = 1024) -> List[Document]:
+        if self.columnar:
+            return self._split_text_columnar(text, filename, token_limit=token_limit)
+        return self._split_text_rowwise(text, filename, token_limit=token_limit)
+
+    def _split_text_columnar(self, text: str, filename: str, token_limit: int = 1024) -> List[Document]:
+        filename = get_filename_from_filepath(filename)
+        TOKEN_ESTIMATOR = TokenEstimator()
+        header_tokens = int(TOKEN_ESTIMATOR.count_tokens_batch(list(pd.read_csv(io.StringIO(text), nrows=1).columns)).sum())
+        approx_token_limit = token_limit - 256 if token_limit > 384 else token_limit
+
+        # Keep the row values of every 1024-row read separately: like iterrows, the values of a row
+        # are upcast to the common dtype of the read they come from.
+        columns = None
+        read_values: List[np.ndarray] = []
+        md_rows: List[str] = []
+        chunked_csv = pd.read_csv(io.StringIO(text), chunksize=1024)
+        for i, chunk_df in enumerate(chunked_csv):
+            print(f"Done num rows={i * 1024}")
+            columns = chunk_df.columns
+            values = chunk_df.values
+            read_values.append(values)
+            md_rows.extend(rows_to_markdown(values))
+        if not md_rows:
+            return []
+
+        row_tokens = TOKEN_ESTIMATOR.count_tokens_batch(md_rows)
+        boundaries = get_chunk_boundaries(row_tokens, approx_token_limit - header_tokens)
+        summaries = summarize_chunks(read_values, columns, boundaries)
+
+        header = "| " + " | ".join(columns) + " |"
+        separator = "| --- " * len(columns) + "|"
+        out_docs = []
+        for chunk_counter, ((start, end), chunk_summaries) in enumerate(zip(boundaries, summaries)):
+            content_for_doc = write_summary_to_file(chunk_summaries, content="")
+            content_for_doc += "\n".join(
+                [f"#### Chunk no. {chunk_counter}", header, separator, *md_rows[start:end], "\n\n"]
+            )
+            fname = f"{filename}_chunk_{chunk_counter}.txt"
+            out_docs.append(
+                Document(content=content_for_doc, filepath=fname, title=content_for_doc.split("\n")[0].strip()))
+        return out_docs
+
+    def _split_text_rowwise(self, text: str, filename: str, token_limit: int = 1024) -> List[Document]:
         out_docs = []
         chunk = []
         filename = get_filename_from_filepath(filename)
         current_tokens = 0
         chunk_counter = 0
         TOKEN_ESTIMATOR = TokenEstimator()
-        header_tokens = sum(TOKEN_ESTIMATOR.estimate_tokens(col) for col in pd.read_csv(io.StringIO(text), nrows=1).columns)
+        header_tokens = int(TOKEN_ESTIMATOR.count_tokens_batch(list(pd.read_csv(io.StringIO(text), nrows=1).columns)).sum())
         approx_token_limit = token_limit - 256 if token_limit > 384 else token_limit
         chunked_csv = pd.read_csv(io.StringIO(text), chunksize=1024)
         for i, chunk_df in enumerate(chunked_csv):
 
             print(f"Done num rows={i * 1024}")
-            for _, row in chunk_df.iterrows():
-                md_row = row_to_markdown(row)
-                row_tokens = TOKEN_ESTIMATOR.estimate_tokens(md_row)
+            rows = [row for _, row in chunk_df.iterrows()]
+            all_row_tokens = TOKEN_ESTIMATOR.count_tokens_batch([row_to_markdown(row) for row in rows]).tolist()
+            for row, row_tokens in zip(rows, all_row_tokens):
                 chunk_df = pd.DataFrame(chunk)
 
                 if current_tokens + row_tokens + header_tokens > approx_token_limit and chunk:
@@ -65,36 +119,76 @@ class CSVChunker(CustomChunker):
 
    
 class PdfChunker(CustomChunker):
-    
-    def extract_caption(self, text):
-        separator = self._separators[-1]
+    """Chunks the html-like content Form Recognizer extracts from PDFs, e.g.
+    <h1>title</h1> text <table><tr><th>..</th></tr><tr><td>..</td></tr></table> text.
+
+    Text is split recursively on sentence endings and word breaks. Tables are located in a single
+    scan over their tags, so nested tables stay inside the row that holds them and a table left
+    open runs to the end of the content. A table larger than the token limit is split between its
+    rows into mini-tables, each prefixed with the caption of the text before the table and with
+    the header rows of the table.
+    """
+    _TABLE_TAG_RE = re.compile(r"<(/?)(table|tr)\b[^>]*>", re.IGNORECASE)
+    _HEADER_CELL_RE = re.compile(r"<th\b", re.IGNORECASE)
+    _DATA_CELL_RE = re.compile(r"<td\b", re.IGNORECASE)
+
+    def _find_separator(self, text: str) -> Optional[str]:
         for _s in self._separators:
-            if _s == "":
-                separator = _s
-                break
             if _s in text:
-                separator = _s
-                break
-        
-        # Now that we have the separator, split the text
+                return _s
+        return None
+
+    def extract_caption(self, text):
+        caption = ""
+        for tag in (self._pdf_headers['title'], self._pdf_headers['sectionHeading']):
+            # text of the last heading, up to its closing tag
+            start = text.rfind(f"<{tag}>")
+            if start != -1:
+                start += len(tag) + 2
+                end = text.find(f"</{tag}>", start)
+                caption += text[start:end] if end != -1 else text[start:]
+
+        # last non-empty line of the text
+        separator = self._find_separator(text)
+        end = len(text)
         if separator:
-            lines = text.split(separator)
+            while end >= len(separator) and text.startswith(separator, end - len(separator)):
+                end -= len(separator)
+            start = text.rfind(separator, 0, end)
+            last_line = text[start + len(separator):end] if start != -1 else text[:end]
         else:
-            lines = list(text)
-        
-        # remove empty lines
-        lines = [line for line in lines if line!='']
-        caption = ""
-        
-        if len(text.split(f"<{self._pdf_headers['title']}>"))>1:
-            caption +=  text.split(f"<{self._pdf_headers['title']}>")[-1].split(f"</{self._pdf_headers['title']}>")[0]
-        if len(text.split(f"<{self._pdf_headers['sectionHeading']}>"))>1:
-            caption +=  text.split(f"<{self._pdf_headers['sectionHeading']}>")[-1].split(f"</{self._pdf_headers['sectionHeading']}>")[0]
-        
-        caption += "\n"+ lines[-1].strip()
+            last_line = text
+        caption += "\n"+ last_line.strip()
 
         return caption
 
+    def _scan_tables(self, text: str) -> List[Tuple[int, int, List[int]]]:
+        """Locates the top-level tables of the text in a single pass over the table and row tags.
+        @param text: The text to scan.
+        @returns A (start, end, row_starts) tuple per table, where text[start:end] is the table
+            including its opening and closing tags, and row_starts are the offsets of its
+            top-level <tr> tags. A </table> without an opening tag is left in the text."""
+        tables = []
+        depth = 0
+        start = 0
+        row_starts: List[int] = []
+        for match in self._TABLE_TAG_RE.finditer(text):
+            closing, tag = match.group(1), match.group(2).lower()
+            if tag == "table":
+                if not closing:
+                    if depth == 0:
+                        start, row_starts = match.start(), []
+                    depth += 1
+                elif depth > 0:
+                    depth -= 1
+                    if depth == 0:
+                        tables.append((start, match.end(), row_starts))
+            elif depth == 1 and not closing:
+                row_starts.append(match.start())
+        if depth > 0:
+            tables.append((start, len(text), row_starts))
+        return tables
+
     def split_text(self, text: str, token_limit: int = 1024, chunk_overlap: int = 128) -> List[str]:
         self._table_tags = {
             "table_open": "<table>", 
@@ -108,29 +202,26 @@ class PdfChunker(CustomChunker):
         SENTENCE_ENDINGS = [".", "!", "?"]
         WORDS_BREAKS = list(
             reversed([",", ";", ":", " ", "(", ")", "[", "]", "{", "}", "\t", "\n"]))
-        self._separators = (SENTENCE_ENDINGS + WORDS_BREAKS) or ["\n\n", "\n", " ", ""]
+        self._separators = SENTENCE_ENDINGS + WORDS_BREAKS
         TOKEN_ESTIMATOR = TokenEstimator()
         self._length_function = TOKEN_ESTIMATOR.estimate_tokens
+        self._batch_length_function = TOKEN_ESTIMATOR.count_tokens_batch
         self._chunk_size = token_limit
         self._chunk_overlap = chunk_overlap
         self._noise = 50 # tokens to accommodate differences in token calculation, we don't want the chunking-on-the-fly to inadvertently chunk anything due to token calc mismatch
 
-
-        start_tag = self._table_tags["table_open"]
-        end_tag = self._table_tags["table_close"]
-        splits = text.split(start_tag)
-        
-        final_chunks = self.chunk_rest(splits[0]) # the first split is before the first table tag so it is regular text
+        tables = self._scan_tables(text)
+        text_end = tables[0][0] if tables else len(text)
+        final_chunks = self.chunk_rest(text[:text_end]) # the text before the first table is regular text
         
         table_caption_prefix = ""
         if len(final_chunks)>0:
             table_caption_prefix += self.extract_caption(final_chunks[-1]) # extracted from the last chunk before the table
-        for part in splits[1:]:
-            table, rest = part.split(end_tag)
-            table = start_tag + table + end_tag 
-            minitables = self.chunk_table(table, table_caption_prefix)
+        for i, (start, end, row_starts) in enumerate(tables):
+            minitables = self.chunk_table(text[start:end], table_caption_prefix, [row_start - start for row_start in row_starts])
             final_chunks.extend(minitables)
 
+            rest = text[end:tables[i + 1][0] if i + 1 < len(tables) else len(text)]
             if rest.strip()!="":
                 text_minichunks = self.chunk_rest(rest)
                 final_chunks.extend(text_minichunks)
@@ -143,82 +234,99 @@ class PdfChunker(CustomChunker):
         return final_final_chunks
     
     def chunk_rest(self, item):
-        separator = self._separators[-1]
-        for _s in self._separators:
-            if _s == "":
-                separator = _s
-                break
-            if _s in item:
-                separator = _s
-                break
+        separator = self._find_separator(item)
         chunks = []
         if separator:
             splits = item.split(separator)
         else:
+            # no separator left, e.g. a long url, fall back to characters
+            separator = ""
             splits = list(item)
         _good_splits = []
-        for s in splits:
-            if self._length_function(s) < self._chunk_size - self._noise:
+        _good_lengths = []
+        for s, s_len in zip(splits, self._batch_length_function(splits).tolist()):
+            if s_len < self._chunk_size - self._noise or len(s) <= 1:
                 _good_splits.append(s)
+                _good_lengths.append(s_len)
             else:
                 if _good_splits:
-                    merged_text = self._merge_splits(_good_splits, separator)
+                    merged_text = self._merge_splits(_good_splits, separator, _good_lengths)
                     chunks.extend(merged_text)
                     _good_splits = []
+                    _good_lengths = []
                 other_info = self.chunk_rest(s)
                 chunks.extend(other_info)
         if _good_splits:
-            merged_text = self._merge_splits(_good_splits, separator)
+            merged_text = self._merge_splits(_good_splits, separator, _good_lengths)
             chunks.extend(merged_text)
         return chunks
     
-    def chunk_table(self, table, caption):
+    def chunk_table(self, table: str, caption: str, row_starts: Optional[List[int]] = None) -> List[str]:
+        """Splits a table between its rows into mini-tables that fit the token limit.
+        @param table: The table, including its opening and closing tags.
+        @param caption: Caption prepended to every mini-table.
+        @param row_starts: Offsets of the top-level <tr> tags in the table, scanned if not given.
+        @returns The mini-tables, each prefixed with the caption and the leading header rows."""
         if self._length_function("\n".join([caption, table])) < self._chunk_size - self._noise:
             return ["\n".join([caption, table])]
-        else:
-            headers = ""
-            if re.search("<th.*>.*</th>", table):
-                header = re.search("<th.*>.*</th>", table) # extract the header out. Opening tag may contain rowspan/colspan
-                if header is not None:
-                    headers += header.group() 
-            splits = table.split(self._table_tags["row_open"]) #split by row tag
-            tables = []
-            current_table = caption + "\n"
-            for part in splits:
-                if len(part)>0:
-                    if self._length_function(current_table + self._table_tags["row_open"] + part) < self._chunk_size: # if current table length is within permissible limit, keep adding rows
-                        if part not in [self._table_tags["table_open"], self._table_tags["table_close"]]: # need add the separator (row tag) when the part is not a table tag
-                            current_table += self._table_tags["row_open"]
-                        current_table += part
-                        
-                    else:
-                        
-                        # if current table size is beyond the permissible limit, complete this as a mini-table and add to final mini-tables list
-                        current_table += self._table_tags["table_close"]
-                        tables.append(current_table)
-
-                        # start a new table
-                        current_table = "\n".join([caption, self._table_tags["table_open"], headers])
-                        if part not in [self._table_tags["table_open"], self._table_tags["table_close"]]:
-                            current_table += self._table_tags["row_open"]
-                        current_table += part
 
-            
-            # TO DO: fix the case where the last mini table only contain tags
-            
-            if not current_table.endswith(self._table_tags["table_close"]):
-                
-                tables.append(current_table + self._table_tags["table_close"])
+        if row_starts is None:
+            row_starts = self._scan_tables(table)[0][2]
+        close_tag = self._table_tags["table_close"]
+        # the opening tag and anything before the first row, then one part per row up to the next
+        # one, the last row keeping the closing tag of the table
+        parts = [table[:row_starts[0]] if row_starts else table]
+        parts.extend(table[row_start:row_end] for row_start, row_end in zip(row_starts, row_starts[1:] + [len(table)]))
+        part_lengths = self._batch_length_function(parts).tolist()
+
+        # leading rows with header cells only are repeated at the top of every mini-table
+        num_headers = 0
+        for part in parts[1:-1]:
+            if not self._HEADER_CELL_RE.search(part) or self._DATA_CELL_RE.search(part):
+                break
+            num_headers += 1
+        opening_tag = self._TABLE_TAG_RE.match(table)
+        table_start = "\n".join([caption, opening_tag.group() if opening_tag else self._table_tags["table_open"], ""])
+        if num_headers:
+            table_start += "".join(parts[1:1 + num_headers])
+        table_start_tokens = self._length_function(table_start)
+        if table_start_tokens >= self._chunk_size - self._noise:
+            # headers that leave no room for rows are not repeated
+            table_start = "\n".join([caption, self._table_tags["table_open"], ""])
+            table_start_tokens = self._length_function(table_start)
+
+        # Rows are counted in one batch and the size of the current table is tracked as the sum of
+        # its rows. The table is only encoded as a whole once that sum comes within noise tokens
+        # of the limit, as tokens merging across rows make the sum slightly off.
+        tables = []
+        current_table = [caption + "\n", parts[0]]
+        current_tokens = self._length_function(current_table[0]) + part_lengths[0]
+        current_rows = 0
+        for part, part_tokens in zip(parts[1:], part_lengths[1:]):
+            new_tokens = current_tokens + part_tokens
+            if new_tokens >= self._chunk_size - self._noise:
+                new_tokens = self._length_function("".join(current_table) + part)
+            # keep adding rows while the current table is within the permissible limit, and at least one
+            if new_tokens < self._chunk_size or current_rows == 0:
+                current_table.append(part)
+                current_tokens = new_tokens
+                current_rows += 1
             else:
-                tables.append(current_table)
-            return tables
+                # if current table size is beyond the permissible limit, complete this as a mini-table and start a new one
+                tables.append("".join(current_table) + close_tag)
+                current_table = [table_start, part]
+                current_tokens = table_start_tokens + part_tokens
+                current_rows = 1
+
+        current_table = "".join(current_table)
+        tables.append(current_table if current_table.endswith(close_tag) else current_table + close_tag)
+        return tables
         
     def merge_chunks_serially(self, chunked_content_list: List[str], num_tokens: int) -> Generator[Tuple[str, int], None, None]:
         # TODO: solve for token overlap
         current_chunk = ""
         total_size = 0
-        for chunked_content in chunked_content_list:
-            chunk_size = self._length_function(chunked_content)
+        for chunked_content, chunk_size in zip(chunked_content_list, self._batch_length_function(chunked_content_list).tolist()):
             if total_size > 0:
                 new_size = total_size + chunk_size
                 if new_size > num_tokens:
@@ -230,16 +338,19 @@ class PdfChunker(CustomChunker):
         if total_size > 0:
             yield current_chunk, total_size
 
-    def _merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+    def _merge_splits(self, splits: Iterable[str], separator: str, lengths: Optional[List[int]] = None) -> List[str]:
         # We now want to combine these smaller pieces into medium size
         # chunks to send to the LLM.
+        splits = list(splits)
+        if lengths is None:
+            lengths = self._batch_length_function(splits).tolist()
         separator_len = self._length_function(separator)
 
         docs = []
         current_doc: List[str] = []
+        current_lengths: List[int] = []
         total = 0
-        for d in splits:
-            _len = self._length_function(d)
+        for d, _len in zip(splits, lengths):
             if (
                 total + _len + (separator_len if len(current_doc) > 0 else 0)
                 > self._chunk_size
@@ -261,11 +372,13 @@ class PdfChunker(CustomChunker):
                         > self._chunk_size
                         and total > 0
                     ):
-                        total -= self._length_function(current_doc[0]) + (
+                        total -= current_lengths[0] + (
                             separator_len if len(current_doc) > 1 else 0
                         )
                         current_doc = current_doc[1:]
+                        current_lengths = current_lengths[1:]
             current_doc.append(d)
+            current_lengths.append(_len)
             total += _len + (separator_len if len(current_doc) > 1 else 0)
         doc = self._join_docs(current_doc, separator)
         if doc is not None:
@@ -294,6 +407,7 @@ class RecursiveCharacterTextSplitter(CustomChunker):
         separator = separators[-1]
         TOKEN_ESTIMATOR = TokenEstimator()
         self._length_function = TOKEN_ESTIMATOR.estimate_tokens
+        self._batch_length_function = TOKEN_ESTIMATOR.count_tokens_batch
         new_separators = []
         for i, _s in enumerate(separators):
             _separator = _s if self._is_separator_regex else re.escape(_s)
@@ -309,15 +423,18 @@ class RecursiveCharacterTextSplitter(CustomChunker):
 
         # Now go merging things, recursively splitting longer texts.
         _good_splits = []
+        _good_lengths = []
         _separator = "" if self._keep_separator else separator
-        for s in splits:
-            if self._length_function(s) < self._chunk_size:
+        for s, s_len in zip(splits, self._batch_length_function(splits).tolist()):
+            if s_len < self._chunk_size:
                 _good_splits.append(s)
+                _good_lengths.append(s_len)
             else:
                 if _good_splits:
-                    merged_text = self._merge_splits(_good_splits, _separator)
+                    merged_text = self._merge_splits(_good_splits, _separator, _good_lengths)
                     final_chunks.extend(merged_text)
                     _good_splits = []
+                    _good_lengths = []
                 if not new_separators:
                     for i in range(math.ceil(len(s)/self._chunk_size)):
                         snippet = s[i: i + self._chunk_size]
@@ -326,7 +443,7 @@ class RecursiveCharacterTextSplitter(CustomChunker):
                     other_info = self._split_text(s, token_limit=self._chunk_size, chunk_overlap=self._chunk_overlap, separators=new_separators)
                     final_chunks.extend(other_info)
         if _good_splits:
-            merged_text = self._merge_splits(_good_splits, _separator)
+            merged_text = self._merge_splits(_good_splits, _separator, _good_lengths)
             final_chunks.extend(merged_text)
         
         return final_chunks
@@ -353,16 +470,19 @@ class RecursiveCharacterTextSplitter(CustomChunker):
         return [s for s in splits if s != ""]
 
 
-    def _merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+    def _merge_splits(self, splits: Iterable[str], separator: str, lengths: Optional[List[int]] = None) -> List[str]:
         # We now want to combine these smaller pieces into medium size
         # chunks to send to the LLM.
+        splits = list(splits)
+        if lengths is None:
+            lengths = self._batch_length_function(splits).tolist()
         separator_len = self._length_function(separator)
 
         docs = []
         current_doc: List[str] = []
+        current_lengths: List[int] = []
         total = 0
-        for d in splits:
-            _len = self._length_function(d)
+        for d, _len in zip(splits, lengths):
             if (
                 total + _len + (separator_len if len(current_doc) > 0 else 0)
                 > self._chunk_size
@@ -384,11 +504,13 @@ class RecursiveCharacterTextSplitter(CustomChunker):
                         > self._chunk_size
                         and total > 0
                     ):
-                        total -= self._length_function(current_doc[0]) + (
+                        total -= current_lengths[0] + (
                             separator_len if len(current_doc) > 1 else 0
                         )
                         current_doc = current_doc[1:]
+                        current_lengths = current_lengths[1:]
             current_doc.append(d)
+            current_lengths.append(_len)
             total += _len + (separator_len if len(current_doc) > 1 else 0)
         doc = self._join_docs(current_doc, separator)
         if doc is not None:
@@ -404,6 +526,168 @@ class RecursiveCharacterTextSplitter(CustomChunker):
             return text
 
 
+class TokenOffsetTextSplitter(CustomChunker):
+    """Separator based splitter that tokenizes the document only once.
+
+    The document is encoded a single time and a token -> character offset map is kept.
+    The token count of any span of the document is then the difference of two binary
+    searches over that map, so recursing into long splits and merging short ones never
+    re-encodes text. Splits are merged greedily with a binary search over their cumulative
+    token counts, and overlap is computed by index arithmetic on the same prefix sums.
+
+    Chunk boundaries follow RecursiveCharacterTextSplitter (same separators, same
+    recursion, same merge and overlap rules) with this tolerance:
+        - Token counts come from the full document encoding. A chunk re-encoded on its own
+          may differ by a few tokens where a BPE merge spans a chunk boundary, which can
+          move a boundary to the neighbouring separator occurrence.
+        - Chunks are returned as slices of the original text, so runs of consecutive
+          separators are preserved verbatim instead of being collapsed by the join.
+        - Text without any separator is cut on token boundaries instead of characters.
+    """
+    _token_byte_lengths: Dict[str, np.ndarray] = {}
+
+    def __init__(self, separators=None, keep_separator=True, is_separator_regex=False, **kwargs: Any):
+        self._separators = separators or ["\n\n", "\n", " ", ""]
+        self._keep_separator = keep_separator
+        self._is_separator_regex = is_separator_regex
+        self._tokenizer = TokenEstimator.GPT2_TOKENIZER
+        self._token_estimator = TokenEstimator()
+
+    def split_text(self, text: str, token_limit: int = 1024, chunk_overlap: int = 0) -> List[str]:
+        self._chunk_size = token_limit
+        self._chunk_overlap = chunk_overlap
+        self._text = text
+        tokens = self._tokenizer.encode(text, allowed_special="all")
+        self._offsets = self._token_char_offsets(tokens, text)
+        spans = self._split_span(0, len(text), self._separators)
+        self._text, self._offsets = "", []
+
+        chunks = []
+        for start, end in spans:
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def _token_char_offsets(self, tokens: List[int], text: str) -> List[int]:
+        """Character offset at which each token starts, like Encoding.decode_with_offsets but vectorized."""
+        lengths = self._token_byte_lengths.get(self._tokenizer.name)
+        if lengths is None:
+            lengths = np.zeros(self._tokenizer.n_vocab, dtype=np.int64)
+            for token in range(self._tokenizer.n_vocab):
+                try:
+                    lengths[token] = len(self._tokenizer.decode_single_token_bytes(token))
+                except KeyError:
+                    pass
+            self._token_byte_lengths[self._tokenizer.name] = lengths
+        token_lengths = lengths[np.asarray(tokens, dtype=np.int64)]
+        byte_offsets = np.concatenate(([0], np.cumsum(token_lengths)[:-1])) if len(tokens) else np.zeros(0, dtype=np.int64)
+        if text.isascii():
+            return byte_offsets.tolist()
+        # map byte offsets to characters; a token starting inside a multi-byte character belongs to that character
+        text_bytes = np.frombuffer(text.encode("utf-8", errors="surrogatepass"), dtype=np.uint8)
+        char_of_byte = np.cumsum((text_bytes & 0xC0) != 0x80) - 1
+        return char_of_byte[np.minimum(byte_offsets, len(text_bytes) - 1)].tolist()
+
+    def _token_index(self, char_pos: int) -> int:
+        # number of tokens starting before char_pos
+        return bisect.bisect_left(self._offsets, char_pos)
+
+    def _count(self, start: int, end: int) -> int:
+        return self._token_index(end) - self._token_index(start)
+
+    def _pattern(self, separator: str) -> "re.Pattern":
+        return re.compile(separator if self._is_separator_regex else re.escape(separator))
+
+    def _split_span(self, start: int, end: int, separators: List[str]) -> List[Tuple[int, int]]:
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            if _s == "":
+                separator = _s
+                break
+            if self._pattern(_s).search(self._text, start, end):
+                separator = _s
+                new_separators = separators[i + 1:]
+                break
+        if separator == "":
+            return self._split_by_tokens(start, end)
+
+        splits = self._split_span_with_regex(start, end, self._pattern(separator))
+        separator_len = 0 if self._keep_separator else self._token_estimator.estimate_tokens(separator)
+
+        spans = []
+        _good_splits = []
+        for split in splits:
+            if self._count(*split) < self._chunk_size:
+                _good_splits.append(split)
+            else:
+                if _good_splits:
+                    spans.extend(self._merge_spans(_good_splits, separator_len))
+                    _good_splits = []
+                if not new_separators:
+                    spans.extend(self._split_by_tokens(*split))
+                else:
+                    spans.extend(self._split_span(split[0], split[1], new_separators))
+        if _good_splits:
+            spans.extend(self._merge_spans(_good_splits, separator_len))
+        return spans
+
+    def _split_span_with_regex(self, start: int, end: int, pattern: "re.Pattern") -> List[Tuple[int, int]]:
+        splits = []
+        split_start = start
+        for match in pattern.finditer(self._text, start, end):
+            if match.end() == match.start():
+                continue
+            splits.append((split_start, match.start()))
+            split_start = match.start() if self._keep_separator else match.end()
+        splits.append((split_start, end))
+        return [(s, e) for s, e in splits if e > s]
+
+    def _merge_spans(self, splits: List[Tuple[int, int]], separator_len: int) -> List[Tuple[int, int]]:
+        # prefix[k] is the token count of splits[:k], each followed by one separator
+        prefix = [0]
+        for split in splits:
+            prefix.append(prefix[-1] + self._count(*split) + separator_len)
+
+        def total(i: int, j: int) -> int:
+            return prefix[j] - prefix[i] - separator_len if j > i else 0
+
+        spans = []
+        i = 0
+        n = len(splits)
+        while i < n:
+            # furthest j such that splits[i:j] fits in a chunk (always at least one split)
+            j = bisect.bisect_right(prefix, prefix[i] + self._chunk_size + separator_len) - 1
+            j = min(max(j, i + 1), n)
+            spans.append((splits[i][0], splits[j - 1][1]))
+            if j == n:
+                break
+            # keep the longest tail of splits[i:j] that fits the overlap and leaves room for splits[j]
+            next_len = prefix[j + 1] - prefix[j] - separator_len
+            first = bisect.bisect_left(prefix, prefix[j] - separator_len - self._chunk_overlap, i + 1, j + 1)
+            while first < j and total(first, j) + next_len + separator_len > self._chunk_size:
+                first += 1
+            i = first
+        return spans
+
+    def _split_by_tokens(self, start: int, end: int) -> List[Tuple[int, int]]:
+        last_token = self._token_index(end)
+        step = max(1, self._chunk_size - self._chunk_overlap)
+        spans = []
+        span_start = start
+        token = self._token_index(start)
+        while True:
+            window_end = token + self._chunk_size
+            span_end = self._offsets[window_end] if window_end < last_token else end
+            spans.append((span_start, span_end))
+            if span_end >= end:
+                break
+            token += step
+            span_start = self._offsets[token]
+        return spans
+
+
 class MarkdownTextSplitter(RecursiveCharacterTextSplitter):
     """Attempts to split the text along Markdown-formatted headings."""
     def __init__(self, **kwargs: Any) -> None:
@@ -451,6 +735,106 @@ def row_to_markdown(row: pd.Series) -> str:
     return "| " + " | ".join(row.map(str)) + " |"
 
 
+def rows_to_markdown(values: np.ndarray) -> List[str]:
+    """Convert a 2D array of row values to Markdown table rows, matching row_to_markdown."""
+    return ["| " + " | ".join(map(str, row)) + " |" for row in values.tolist()]
+
+
+def get_chunk_boundaries(row_tokens: np.ndarray, token_limit: int) -> List[Tuple[int, int]]:
+    """
+    Group consecutive rows into chunks of at most token_limit tokens (a chunk always holds at
+    least one row). Returns (start, end) row ranges, found by binary search over the cumulative
+    row token counts.
+    """
+    cumulative = np.concatenate(([0], np.cumsum(row_tokens)))
+    boundaries = []
+    start = 0
+    while start < len(row_tokens):
+        end = int(np.searchsorted(cumulative, cumulative[start] + token_limit, side="right")) - 1
+        end = max(end, start + 1)
+        boundaries.append((start, end))
+        start = end
+    return boundaries
+
+
+def rows_to_frame(values: np.ndarray, columns: pd.Index) -> pd.DataFrame:
+    """Build the DataFrame pandas builds from a list of row Series holding these values."""
+    if values.dtype == object:
+        # object rows get the same soft per-column dtype inference as a list of Series
+        return pd.DataFrame(list(values), columns=columns)
+    return pd.DataFrame(values, columns=columns)
+
+
+def grouped_unique(series: pd.Series, group_ids: np.ndarray, num_groups: int) -> List[np.ndarray]:
+    """Unique values of series within each group, in order of appearance like Series.unique."""
+    pairs = pd.DataFrame({"group": group_ids, "value": series.to_numpy()}).drop_duplicates()
+    counts = np.bincount(pairs["group"].to_numpy(), minlength=num_groups)
+    return np.split(pairs["value"].to_numpy(), np.cumsum(counts)[:-1])
+
+
+def summarize_chunks(
+        read_values: List[np.ndarray],
+        columns: pd.Index,
+        boundaries: List[Tuple[int, int]]
+) -> List[Dict[str, Union[Tuple[float, float], str, List[str]]]]:
+    """
+    Summarize every chunk given by boundaries, with the same output as calling summarize_chunk on
+    a DataFrame of each chunk's rows. Uses one groupby aggregation over all rows when every column
+    infers to the same dtype in every chunk, and falls back to summarize_chunk per chunk otherwise.
+    """
+    dtypes = {values.dtype for values in read_values}
+    values = np.vstack(read_values) if len(read_values) > 1 else read_values[0]
+    stable = len(dtypes) == 1 and (
+        values.dtype != object or all(
+            pd.api.types.infer_dtype(values[:, i], skipna=False) in ("integer", "floating", "boolean", "string")
+            for i in range(len(columns))
+        )
+    )
+    if not stable:
+        # a chunk's dtypes depend on its own rows; build each chunk's frame the way the row-wise chunker does
+        offsets = np.cumsum([0] + [len(v) for v in read_values])
+        summaries = []
+        for start, end in boundaries:
+            first, last = np.searchsorted(offsets, start, side="right") - 1, np.searchsorted(offsets, end, side="left")
+            parts = [read_values[r][max(start - offsets[r], 0):end - offsets[r]] for r in range(first, last)]
+            summaries.append(summarize_chunk(rows_to_frame(np.vstack(parts), columns)))
+        return summaries
+
+    frame = rows_to_frame(values, columns)
+    num_chunks = len(boundaries)
+    chunk_sizes = np.array([end - start for start, end in boundaries])
+    group_ids = np.repeat(np.arange(num_chunks), chunk_sizes)
+    summaries = [{} for _ in range(num_chunks)]
+    for column in frame.columns:
+        series = frame[column]
+        grouped = series.groupby(group_ids, sort=False)
+        if np.issubdtype(series.dtype, np.number):
+            notna = series.notna().to_numpy()
+            unique_values = grouped_unique(series[notna], group_ids[notna], num_chunks)
+            mins, maxs = grouped.min().to_numpy(), grouped.max().to_numpy()
+            for g in range(num_chunks):
+                group_unique = unique_values[g]
+                if len(group_unique) < 5:
+                    summaries[g][column] = group_unique.tolist()
+                else:
+                    summaries[g][column] = (mins[g], maxs[g])
+        elif series.dtype == 'bool':
+            true_counts = grouped.sum().to_numpy()
+            for g in range(num_chunks):
+                summaries[g][column] = f"True: {true_counts[g]}, False: {chunk_sizes[g] - true_counts[g]}"
+        else:
+            unique_values = grouped_unique(series, group_ids, num_chunks)
+            for g in range(num_chunks):
+                group_unique = unique_values[g]
+                if len(group_unique) > 10:
+                    summaries[g][
+                        column] = f"{len(group_unique)} unique values. " \
+                                  f"Few Random examples: {','.join([str(x) for x in group_unique[:5]])}"
+                else:
+                    summaries[g][column] = group_unique.tolist()
+    return summaries
+
+
 def summarize_chunk(chunk: pd.DataFrame) -> Dict[str, Union[Tuple[float, float], str, List[str]]]:
     """
     Summarize a given chunk's columns. For numerical columns,
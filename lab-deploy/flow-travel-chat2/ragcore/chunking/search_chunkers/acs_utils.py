@@ -2,7 +2,7 @@ import re
 from dataclasses import fields
 from ragcore.datamodels.document import Document
 from ragcore.datamodels.search_results_acs import SearchResultsACS, Metadata
-from typing import Set, List, Dict, Any
+from typing import Set, List, Dict, Any, Optional
 
 FIELD_GUESSES = {
     "title": {"title"},
@@ -11,6 +11,28 @@ FIELD_GUESSES = {
     "metadata": {"metadata"}
 }
 
+# canonical name of every guessed field name, e.g. "uri" -> "url"
+FIELD_ALIASES: Dict[str, str] = {alias: field_type for field_type, aliases in FIELD_GUESSES.items() for alias in aliases}
+
+# Metadata attribute of every metadata field the chunkers read, by canonical field name
+METADATA_FIELDS = {
+    "@search.score": "search_score",
+    "@search.reranker_score": "search_reranker_score",
+    "@search.highlights": "search_highlights",
+    "filepath": "filepath",
+    "url": "url",
+    "chunk_id": "chunk_id",
+    "title": "title"
+}
+
+# Metadata attribute of every raw metadata field name, canonical or guessed. Fields missing here,
+# e.g. the embedding vector, are skipped without being copied.
+METADATA_LOOKUP: Dict[str, str] = {
+    name: METADATA_FIELDS[FIELD_ALIASES.get(name, name)]
+    for name in set(METADATA_FIELDS) | set(FIELD_ALIASES)
+    if FIELD_ALIASES.get(name, name) in METADATA_FIELDS
+}
+
 TITLE_REGEX = re.compile(r"[tT]itle: (.*)\n")
 
 def parse_results_list(results: List[Dict[str, Any]]) -> List[SearchResultsACS]:
@@ -19,8 +41,7 @@ def parse_results_list(results: List[Dict[str, Any]]) -> List[SearchResultsACS]:
     """
     parsed_results: List[SearchResultsACS] = []
     for [i, result] in enumerate(results):
-        parsed_result = result_to_dataclass(result)
-        parsed_result.metadata.chunk_id = i
+        parsed_result = result_to_dataclass(result, chunk_index=i)
         parsed_results.append(parsed_result)
 
     return parsed_results
@@ -33,29 +54,21 @@ def extract_title_from_content(content: str) -> str:
 
 def normalize_content_fields(obj: Dict[str, Any]) -> Dict[str, Any]:
     guessed_fields = dict()
-    # Loop through all fields from the object
-
-    for item_key in obj.keys():
-        original_name = True
-        item = obj.get(item_key)
+    # Loop through all fields from the object, saving the values of guessed field names under their normalized name
+    for item_key, item in obj.items():
         # It item is dictionary, make recursive call
         if isinstance(item, dict):
             item = normalize_content_fields(item)
-        # Loop through map of field guesses, and try to find any field name that needs to be normalized
-        for field_type in FIELD_GUESSES:
-            # When field is matched, save the original value with the normalized name
-            if item_key in FIELD_GUESSES[field_type]:
-                guessed_fields[field_type] = item
-                original_name = False
-        # If name didn't need normalization, use original one
-        if original_name == True:
-            guessed_fields[item_key] = item
+        guessed_fields[FIELD_ALIASES.get(item_key, item_key)] = item
     return guessed_fields
 
-def result_to_dataclass(result: Dict[str, Any]) -> SearchResultsACS:
-        # Normalize field names
-        result = normalize_content_fields(result)
-
+def result_to_dataclass(result: Dict[str, Any], chunk_index: Optional[int] = None) -> SearchResultsACS:
+        """Transforms a search result into a SearchResultsACS dataclass instance.
+        The metadata is read in a single pass, normalizing the field names on the fly, and fields that
+        SearchResultsACS does not hold, such as the embedding vector, are never copied.
+        @param result: Search result
+        @param chunk_index: Position of the result in its results list, used as chunk_id when given
+        """
         # Extract 1st level of properties
         metadata = None
         score = ""
@@ -65,37 +78,21 @@ def result_to_dataclass(result: Dict[str, Any]) -> SearchResultsACS:
             score = result.get("score", 0)
             text = result.get("text", "")
         
-        # Try to extract metadata properties
-        search_score = None
-        search_reranker_score = None
-        search_highlights = None
-        filepath = None
-        url = None
-        chunk_id = None
-        title = None
+        # Extract metadata properties, a later guessed field name overrides an earlier one
+        metadata_values = {}
         if isinstance(metadata, dict):
-            search_score = metadata.get("@search.score", None)
-            search_reranker_score = metadata.get("@search.reranker_score", None)
-            search_highlights = metadata.get("@search.highlights", None)
-            filepath = metadata.get("filepath", None)
-            url = metadata.get("url", None)
-            chunk_id = metadata.get("chunk_id", None)
-            title = metadata.get("title", None)
+            for key, value in metadata.items():
+                name = METADATA_LOOKUP.get(key)
+                if name is not None:
+                    metadata_values[name] = normalize_content_fields(value) if isinstance(value, dict) else value
 
-        if not title and text:
-            title = extract_title_from_content(text)
+        if not metadata_values.get("title") and text:
+            metadata_values["title"] = extract_title_from_content(text)
 
-        metadata = Metadata(
-            search_score=search_score, 
-            search_reranker_score=search_reranker_score, 
-            search_highlights=search_highlights, 
-            filepath=filepath, 
-            url=url, 
-            chunk_id=chunk_id,
-            title=title
-        )
+        if chunk_index is not None:
+            metadata_values["chunk_id"] = chunk_index
 
-        formatted_result = SearchResultsACS(metadata=metadata, score=score, text=text)
+        formatted_result = SearchResultsACS(metadata=Metadata(**metadata_values), score=score, text=text)
         return formatted_result
 
 def result_to_document(result: SearchResultsACS) -> Document:
@@ -4,18 +4,57 @@ Classes:
     BaseDocumentChunker: Base class for Document Chunker
 """
 
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
-from typing import List, Dict, Any
+from typing import Callable, Dict, List, Any, Optional, Tuple, TypeVar
 from ragcore.datamodels import Document
+from ragcore.datamodels.enums import ExecutionMode
 from ragcore.datamodels.search_result import SearchResult
 
+T = TypeVar("T")
+
+_EXECUTORS: Dict[Tuple[str, Optional[int]], Executor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+def get_executor(execution_mode: str, max_workers: Optional[int] = None) -> Executor:
+    """Returns the process-wide pool for an execution mode, creating it on first use, so that
+    requests do not pay for starting threads or worker processes."""
+    key = (execution_mode, max_workers)
+    executor = _EXECUTORS.get(key)
+    if executor is None:
+        with _EXECUTORS_LOCK:
+            executor = _EXECUTORS.get(key)
+            if executor is None:
+                if execution_mode == ExecutionMode.THREAD.value:
+                    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chunker")
+                else:
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                _EXECUTORS[key] = executor
+    return executor
+
 class BaseDocumentChunker(ABC):
+    """Chunks the search results of every query of a turn.
 
-    def __init__(self):
-        pass
+    The results of each query are chunked independently of the other queries. execution_mode
+    selects whether queries are chunked one after another ("serial"), on a thread pool ("thread")
+    or on a process pool ("process"). All modes return the chunks of each query in the order of
+    the queries and produce the same chunks. With "process", the chunker and the results of a
+    query are pickled to the worker and its chunks are pickled back.
+    """
+
+    def __init__(self, execution_mode: str = ExecutionMode.SERIAL.value, max_workers: Optional[int] = None):
+        # raises ValueError for unknown modes
+        self.execution_mode = ExecutionMode(execution_mode).value
+        self.max_workers = max_workers
 
-    @staticmethod
     @abstractmethod
-    def chunk_results(results: List[SearchResult], max_tokens: int, top_k: int) -> List[List[Document]]:
-        pass
\ No newline at end of file
+    def chunk_results(self, results: List[SearchResult], max_tokens: int, top_k: int) -> List[List[Document]]:
+        pass
+
+    def map_queries(self, fn: Callable[[SearchResult], T], results: List[SearchResult]) -> List[T]:
+        """Applies fn to the search results of every query, in the configured execution mode."""
+        if self.execution_mode == ExecutionMode.SERIAL.value or len(results) < 2:
+            return [fn(search_result) for search_result in results]
+        return list(get_executor(self.execution_mode, self.max_workers).map(fn, results))
@@ -1,5 +1,6 @@
 from enum import Enum
-from ragcore.datamodels.enums import QueryType, DataSourceType
+from typing import Optional
+from ragcore.datamodels.enums import QueryType, DataSourceType, ExecutionMode
 from ragcore.chunking.search_chunkers.base_chunker import BaseDocumentChunker
 from ragcore.chunking.search_chunkers.acs_text_chunker import ACSTextChunker
 from ragcore.chunking.search_chunkers.acs_vector_chunker import ACSVectorChunker
@@ -7,12 +8,12 @@ from ragcore.chunking.search_chunkers.cosmos_chunker import CosmosChunker
 
 class ChunkerFactory:
     @staticmethod
-    def create_chunker(data_source_type: DataSourceType, query_type: QueryType) -> BaseDocumentChunker:
+    def create_chunker(data_source_type: DataSourceType, query_type: QueryType, execution_mode: str = ExecutionMode.SERIAL.value, max_workers: Optional[int] = None) -> BaseDocumentChunker:
         if data_source_type == DataSourceType.ACS.value and query_type in [QueryType.SIMPLE.value, QueryType.SEMANTIC.value]:
-            return ACSTextChunker(query_type)
+            return ACSTextChunker(query_type, execution_mode=execution_mode, max_workers=max_workers)
         elif data_source_type == DataSourceType.ACS.value and query_type in [QueryType.VECTOR.value, QueryType.VECTOR_SIMPLE_HYBRID.value, QueryType.VECTOR_SEMANTIC_HYBRID.value]:
-            return ACSVectorChunker(query_type)
+            return ACSVectorChunker(query_type, execution_mode=execution_mode, max_workers=max_workers)
         elif data_source_type == DataSourceType.COSMOS.value and query_type == QueryType.VECTOR.value:
-            return CosmosChunker()
+            return CosmosChunker(execution_mode=execution_mode, max_workers=max_workers)
         else:
-            raise Exception("Please select a valid Chunker configuration")
\ No newline at end of file
+            raise Exception("Please select a valid Chunker configuration")
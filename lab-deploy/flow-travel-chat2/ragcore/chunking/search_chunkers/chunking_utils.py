@@ -1,6 +1,5 @@
 
-from typing import List, Tuple
-from copy import deepcopy as dc
+from typing import List, Optional, Tuple
 from collections import defaultdict
 from ragcore.utils import get_tfidf_sim_scores
 from ragcore.parsers.parser_factory import ParserFactory
@@ -21,6 +20,19 @@ def update_doc_score(doc: Document, score: float):
     doc.score = score
     return doc
 
+def make_chunk_document(doc: Document, content: str, chunk_id: str, metadata: Optional[dict], score: float) -> Document:
+    """Document for a chunk of doc. Instead of deep copying doc, whose content and metadata are
+    replaced right away, the chunk references doc's remaining fields."""
+    return Document(
+        content=content,
+        chunk_id=chunk_id,
+        score=score,
+        title=doc.title,
+        filepath=doc.filepath,
+        url=doc.url,
+        metadata=metadata
+    )
+
 def combine_docs_with_scores(docs: List[Document], scores: List[float]) -> List[Document]:
     updated_docs = []
     for doc, score in zip(docs, scores):
@@ -53,9 +65,8 @@ def chunk_onthefly_with_highlights(results: List[Document], sim_scores: List[flo
     potential_docs = []
     is_any_doc_chunked = False
     filepath_chunk_id_dict = defaultdict(int)
-    for doc, sim_score, higlighted_text_org in zip(results, sim_scores, highlight_list):
-        content = doc.content
-        num_tokens = TOKEN_ESTIMATOR.estimate_tokens(content)
+    all_num_tokens = TOKEN_ESTIMATOR.count_tokens_batch([doc.content for doc in results]).tolist()
+    for doc, sim_score, higlighted_text_org, num_tokens in zip(results, sim_scores, highlight_list, all_num_tokens):
         base_highlight_count = higlighted_text_org.count(highlight_tag)
         original_metadata = (
             f"orignal document size={num_tokens}. Scores={sim_score}"
@@ -77,13 +88,16 @@ def chunk_onthefly_with_highlights(results: List[Document], sim_scores: List[flo
             if higlighted_text_org:
                 num_tokens_highlights = TOKEN_ESTIMATOR.estimate_tokens(higlighted_text_org)
                 if num_tokens_highlights < max_chunk_size:
-                    new_doc = dc(doc)
-                    new_doc.content = higlighted_text_org
-                    new_doc.metadata = {"chunking": (
+                    new_doc = make_chunk_document(
+                        doc,
+                        content=higlighted_text_org,
+                        chunk_id=f"{base_chunkid}",
+                        metadata={"chunking": (
                             original_metadata
                             + f"Filtering to highlight size={num_tokens_highlights}"
-                    )}
-                    new_doc.chunk_id = f"{base_chunkid}"
+                        )},
+                        score=doc.score
+                    )
                     # we havent changed non-highlighted result.
                     potential_docs.append(
                         (
@@ -100,20 +114,24 @@ def chunk_onthefly_with_highlights(results: List[Document], sim_scores: List[flo
                         num_tokens=max_chunk_size,
                         file_name=doc.filepath
                     )
-                    for cidx, chunk in enumerate(chunks):
-                        new_doc = dc(doc)
-                        new_doc.content = chunk.content.replace(highlight_tag, "").replace(highlight_tag_end, "")
+                    chunk_contents = [chunk.content.replace(highlight_tag, "").replace(highlight_tag_end, "") for chunk in chunks]
+                    chunk_num_tokens = TOKEN_ESTIMATOR.count_tokens_batch(chunk_contents).tolist()
+                    for cidx, (chunk, chunk_content, num_tokens_chunk) in enumerate(zip(chunks, chunk_contents, chunk_num_tokens)):
                         this_chunk_highlights = chunk.content.count(highlight_tag)
-                        num_tokens_chunk = TOKEN_ESTIMATOR.estimate_tokens(new_doc.content)
                         if num_tokens_chunk < 2:
                             # skip empty chunks
                             continue
-                        new_doc.metadata = {"chunking": (
+                        new_doc = make_chunk_document(
+                            doc,
+                            content=chunk_content,
+                            chunk_id=str(base_chunkid + cidx),
+                            metadata={"chunking": (
                                 original_metadata
                                 + f"Filtering to chunk no. {cidx}/Highlights={this_chunk_highlights}"
                                   f" of size={num_tokens_chunk}"
-                        )}
-                        new_doc.chunk_id = str(base_chunkid + cidx)
+                            )},
+                            score=doc.score
+                        )
                         potential_docs.append(
                             (
                                 new_doc,
@@ -153,18 +171,19 @@ def chunk_onthefly(query: str, results: List[Document], sim_scores: List[float],
     if not query:
         raise Exception("Please provide a query to compare against for reranking on the fly chunks")
     
-    potential_docs: List[Tuple[Document, float, int]] = []
+    # Chunks are kept as (source document, content, chunk_id) and only the top_k of them
+    # become Documents, sharing the remaining fields of their source document.
+    potential_docs: List[Tuple[Document, str, str]] = []
     filepath_chunk_id_dict = defaultdict(int)
 
-    for doc, sim_score in zip(results, sim_scores):
-        content = doc.content
-        num_tokens = TOKEN_ESTIMATOR.estimate_tokens(content)
+    all_num_tokens = TOKEN_ESTIMATOR.count_tokens_batch([doc.content for doc in results]).tolist()
+    for doc, sim_score, num_tokens in zip(results, sim_scores, all_num_tokens):
         base_chunkid = 0
         if doc.filepath:
             base_chunkid += filepath_chunk_id_dict[doc.filepath]
         if num_tokens <= max_chunk_size:
             doc.chunk_id = f"{base_chunkid}"
-            potential_docs.append((doc, sim_score, num_tokens))
+            potential_docs.append((doc, doc.content, doc.chunk_id))
         else:
             chunks = TEXT_CHUNKER.chunk_content(
                 content=doc.content,
@@ -172,28 +191,15 @@ def chunk_onthefly(query: str, results: List[Document], sim_scores: List[float],
                 file_name=doc.filepath
             )
             for cidx, chunk in enumerate(chunks):
-                new_doc = dc(doc)
-                new_doc.content = chunk.content
-                new_doc.chunk_id = str(base_chunkid + cidx)
-                num_tokens_chunk = TOKEN_ESTIMATOR.estimate_tokens(new_doc.content)
-                potential_docs.append((new_doc, sim_score, num_tokens_chunk))
+                potential_docs.append((doc, chunk.content, str(base_chunkid + cidx)))
 
     if len(potential_docs) == len(results):
         return results
-    sim_scores = get_tfidf_sim_scores(query, [tup[0].content for tup in potential_docs])
-
-    new_docs: List[Tuple[Document, float, int]] = []
-    for tfidf_score, tup in zip(sim_scores, potential_docs):
-        new_docs.append((tup[0], tfidf_score, tup[2]))
+    sim_scores = get_tfidf_sim_scores(query, [tup[1] for tup in potential_docs])
 
-    top_docs_with_scores = sorted(new_docs, key=lambda tup: tup[1], reverse=True)[:top_k]
+    top_docs_with_scores = sorted(zip(potential_docs, sim_scores), key=lambda tup: tup[1], reverse=True)[:top_k]
 
-    return [Document(
-        content=tup[0].content,
-        chunk_id=tup[0].chunk_id,
-        title=tup[0].title,
-        filepath=tup[0].filepath,
-        url=tup[0].url,
-        metadata=tup[0].metadata,
-        score=tup[1]
-    ) for tup in top_docs_with_scores]
\ No newline at end of file
+    return [
+        make_chunk_document(doc, content=content, chunk_id=chunk_id, metadata=doc.metadata, score=tfidf_score)
+        for (doc, content, chunk_id), tfidf_score in top_docs_with_scores
+    ]
@@ -1,47 +1,49 @@
+import functools
 from typing import List, Dict, Any
 from ragcore.datamodels.document import Document
 from ragcore.chunking.search_chunkers.base_chunker import BaseDocumentChunker
 from ragcore.datamodels.search_result import SearchResult
-from ragcore.chunking.search_chunkers.chunking_utils import chunk_onthefly, get_tfidf_sim_scores, update_doc_score
+from ragcore.chunking.search_chunkers.chunking_utils import chunk_onthefly, update_doc_score
+from ragcore.utils import get_tfidf_sim_scores_batch
 from ragcore.datamodels.search_results_cosmos_vector import SearchResultsCosmosVector
 
 class CosmosChunker(BaseDocumentChunker):
     def chunk_results(self, results: List[SearchResult[SearchResultsCosmosVector]], max_tokens: int, top_k: int) -> List[List[Document]]:
         
-        docs: List[List[Document]] = []
+        docs: List[List[Document]] = self.map_queries(
+            functools.partial(self._chunk_query, max_tokens=max_tokens, top_k=top_k), results)
 
-        for search_results in results:
-            doc_list: List[Document] = []
-            sim_scores: List[float] = []
-            
-            result_docs = search_results.top_k
-            query = search_results.query
+        # get similarity scores since cosmos vector search didn't return it
+        all_sim_scores = get_tfidf_sim_scores_batch(
+            queries=[search_results.query for search_results in results],
+            document_lists=[[f"{doc.title}\n{doc.content}" for doc in chunked_result_doc] for chunked_result_doc in docs],
+            ngram = 2)
 
-            for result in result_docs:
-                doc = self._result_to_document(result)
-                doc_list.append(doc)
-                sim_scores.append(doc.score)
-
-            # chunk on the fly
-            chunked_result_doc = chunk_onthefly(query=query, results=doc_list, sim_scores=sim_scores, max_chunk_size=max_tokens, top_k=top_k) 
-                
-            # get similarity scores since cosmos vector search didn't return it
-            sim_scores = get_tfidf_sim_scores(
-                query= query,
-                document_list=[f"{doc.title}\n{doc.content}" for doc in chunked_result_doc],
-                ngram = 2)
-            
+        for i, (chunked_result_doc, sim_scores) in enumerate(zip(docs, all_sim_scores)):
             # DISCLAIMER: Add 0.2 score to ensure we dont filter documents in range [0.1, 0.3].
             # Correct filter threshold is pending for Cosmos vector search. 
             # Since defualt therhsold is 0.3 this makes it 0.1 for simple search.
             sim_scores = [min(0.2+score, 1.0) for score in sim_scores]
 
             # Update the scores of the documents
-            chunked_results = [update_doc_score(doc, score) for doc, score in zip(chunked_result_doc, sim_scores)]        
-                
-            docs.append(chunked_results)
+            docs[i] = [update_doc_score(doc, score) for doc, score in zip(chunked_result_doc, sim_scores)]
         return docs
     
+    def _chunk_query(self, search_results: SearchResult[SearchResultsCosmosVector], max_tokens: int, top_k: int) -> List[Document]:
+        doc_list: List[Document] = []
+        sim_scores: List[float] = []
+        
+        result_docs = search_results.top_k
+        query = search_results.query
+
+        for result in result_docs:
+            doc = self._result_to_document(result)
+            doc_list.append(doc)
+            sim_scores.append(doc.score)
+
+        # chunk on the fly
+        return chunk_onthefly(query=query, results=doc_list, sim_scores=sim_scores, max_chunk_size=max_tokens, top_k=top_k)
+
     @staticmethod
     def result_to_dataclass(result: Dict[str, Any]) -> SearchResultsCosmosVector:
         """Convert the result to a dataclass object representing the result from Cosmos Vector search"""
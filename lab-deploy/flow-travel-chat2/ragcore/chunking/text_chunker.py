@@ -2,17 +2,35 @@
 
 Classes:
     TextChunker: Text chunker class.
+    IncrementalChunkingResult: Result of an incremental directory chunking run.
 """
 import os
 import json
-from typing import List, Optional
-from tqdm import tqdm
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
 from ragcore.exceptions import UnsupportedFormatError
 from ragcore.parsers import ParserFactory
 from ragcore.chunking.utils import chunk_content_helper_v1, chunk_content_helper_v2
 from ragcore.data_helpers import get_files_recursively
 from ragcore.utils import convert_escaped_to_posix
 from ragcore.datamodels.document import Document
+from ragcore.datamodels.datamodels_utils import dataclass_to_dict
+from ragcore.lazy import LazyModule
+
+tqdm = LazyModule("tqdm")
+
+@dataclass
+class IncrementalChunkingResult:
+    """Result of TextChunker.chunk_directory_incremental. File lists hold relative paths."""
+    chunks: List[Document] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    failures: List[Tuple[str, Exception]] = field(default_factory=list)
 
 class TextChunker:
     """Text chunker class.
@@ -30,6 +48,8 @@ class TextChunker:
         "csv": "csv",
         "pdf": "pdf",
     }
+    MANIFEST_FILE_NAME = "manifest.json"
+    CHUNK_STORE_DIR = "chunks"
 
     def __init__(self, version: str = "v1", extensions_to_process: Optional[List[str]] = None) -> None:
         """Initializes the text chunker.
@@ -37,6 +57,8 @@ class TextChunker:
             version (str): The version of the chunker. v1 is the old version. v2 is the new version.
             extensions_to_process (List[str]): The extensions to process. If None, all extensions are processed. If not None, only the extensions in the list are processed.
         """
+        self._version = version
+        self._extensions = extensions_to_process
         self._parser_factory = ParserFactory()
         if not extensions_to_process:
             self.extensions_to_process = set(self.FILE_FORMAT_DICT.keys())
@@ -194,7 +216,9 @@ class TextChunker:
         num_tokens: int = 256,
         min_chunk_size: int = 10,
         url_prefix: Optional[str] = None,
-        token_overlap: int = 0
+        token_overlap: int = 0,
+        num_workers: int = 1,
+        failures: Optional[List[Tuple[str, Exception]]] = None
     ) -> List[Document]:
         """
         Chunks the given directory recursively
@@ -207,11 +231,146 @@ class TextChunker:
                               For example, if the directory path is /home/user/data and the url_prefix is https://example.com/data, 
                               then the url for the file /home/user/data/file1.txt will be https://example.com/data/file1.txt
             token_overlap (int): The number of tokens to overlap between chunks.
+            num_workers (int): Number of worker processes. 1 chunks in the current process, None uses all cores.
+            failures (List[Tuple[str, Exception]]): If given, (relative file path, error) of every file that
+                                                    failed to chunk is appended to it.
         Returns:
             List[Document]: List of chunked documents.
         """
         chunks = []
-        for file_path in tqdm(get_files_recursively(directory_path)):
+        for file_chunks in self.iter_chunk_directory(
+            directory_path,
+            ignore_errors=ignore_errors,
+            num_tokens=num_tokens,
+            min_chunk_size=min_chunk_size,
+            url_prefix=url_prefix,
+            token_overlap=token_overlap,
+            num_workers=num_workers,
+            failures=failures
+        ):
+            chunks.extend(file_chunks)
+        return chunks
+
+    def iter_chunk_directory(
+        self,
+        directory_path: str,
+        ignore_errors: bool = True,
+        num_tokens: int = 256,
+        min_chunk_size: int = 10,
+        url_prefix: Optional[str] = None,
+        token_overlap: int = 0,
+        num_workers: int = 1,
+        failures: Optional[List[Tuple[str, Exception]]] = None
+    ) -> Generator[List[Document], None, None]:
+        """
+        Chunks the given directory recursively, yielding the chunks of one file at a time.
+        Files are processed in sorted path order and yielded in that order whatever the number
+        of workers, and at most 2 * num_workers files are in flight so memory stays bounded.
+        Args: same as chunk_directory.
+        Yields:
+            List[Document]: The chunked documents of one file.
+        """
+        chunk_kwargs = {
+            "num_tokens": num_tokens,
+            "min_chunk_size": min_chunk_size,
+            "token_overlap": token_overlap
+        }
+        files = self._list_directory_files(directory_path, url_prefix)
+        for _, file_chunks in self._iter_chunk_files(files, ignore_errors, chunk_kwargs, num_workers, failures):
+            yield file_chunks
+
+    def chunk_directory_incremental(
+        self,
+        directory_path: str,
+        store_path: str,
+        ignore_errors: bool = True,
+        num_tokens: int = 256,
+        min_chunk_size: int = 10,
+        url_prefix: Optional[str] = None,
+        token_overlap: int = 0,
+        num_workers: int = 1
+    ) -> IncrementalChunkingResult:
+        """
+        Chunks the given directory recursively, re-chunking only the files that are new or changed
+        since the previous run with the same store_path.
+        The store keeps a manifest (relative path, mtime, size, content hash, chunker version and
+        chunking parameters of every file) next to the chunks of every file. A file is unchanged if
+        its mtime and size, or else its content hash, match the manifest and it was chunked with the
+        same parameters; its chunks are then reloaded from the store.
+        Args:
+            directory_path (str): The directory to chunk.
+            store_path (str): The directory holding the manifest and the chunk store. Created if missing.
+            Other args: same as chunk_directory.
+        Returns:
+            IncrementalChunkingResult: All chunks of the directory and the files that were added,
+                                       changed, unchanged, deleted or failed.
+        """
+        params = {
+            "chunker_version": self._version,
+            "num_tokens": num_tokens,
+            "token_overlap": max(0, token_overlap),
+            "min_chunk_size": min_chunk_size,
+            "url_prefix": url_prefix,
+        }
+        chunk_kwargs = {
+            "num_tokens": num_tokens,
+            "min_chunk_size": min_chunk_size,
+            "token_overlap": token_overlap
+        }
+        os.makedirs(os.path.join(store_path, self.CHUNK_STORE_DIR), exist_ok=True)
+        manifest_path = os.path.join(store_path, self.MANIFEST_FILE_NAME)
+        manifest = _load_manifest(manifest_path)
+        result = IncrementalChunkingResult()
+
+        files = self._list_directory_files(directory_path, url_prefix)
+        file_chunks: Dict[str, List[Document]] = {}
+        new_manifest: Dict[str, Dict[str, Any]] = {}
+        to_chunk = []
+        for file_path, rel_file_path, url_path in files:
+            stat = os.stat(file_path)
+            entry = {"path": rel_file_path, "mtime": stat.st_mtime, "size": stat.st_size, **params}
+            previous = manifest.get(rel_file_path)
+            same_params = previous is not None and all(previous.get(k) == v for k, v in params.items())
+            if same_params and previous["mtime"] == stat.st_mtime and previous["size"] == stat.st_size:
+                entry["content_hash"] = previous["content_hash"]
+            else:
+                entry["content_hash"] = _hash_file(file_path)
+            if same_params and entry["content_hash"] == previous["content_hash"]:
+                chunks = _load_chunks(store_path, rel_file_path)
+                if chunks is not None:
+                    file_chunks[rel_file_path] = chunks
+                    new_manifest[rel_file_path] = entry
+                    result.unchanged.append(rel_file_path)
+                    continue
+            (result.changed if previous is not None else result.added).append(rel_file_path)
+            new_manifest[rel_file_path] = entry
+            to_chunk.append((file_path, rel_file_path, url_path))
+
+        failed_before = len(result.failures)
+        for rel_file_path, chunks in self._iter_chunk_files(
+                to_chunk, ignore_errors, chunk_kwargs, num_workers, result.failures):
+            file_chunks[rel_file_path] = chunks
+            _save_chunks(store_path, rel_file_path, chunks)
+        for rel_file_path, _ in result.failures[failed_before:]:
+            # failed files are retried on the next run
+            new_manifest.pop(rel_file_path, None)
+            _delete_chunks(store_path, rel_file_path)
+
+        current_files = set(rel_file_path for _, rel_file_path, _ in files)
+        for rel_file_path in manifest:
+            if rel_file_path not in current_files:
+                result.deleted.append(rel_file_path)
+                _delete_chunks(store_path, rel_file_path)
+
+        _save_manifest(manifest_path, new_manifest)
+        for _, rel_file_path, _ in files:
+            result.chunks.extend(file_chunks.get(rel_file_path, []))
+        return result
+
+    def _list_directory_files(self, directory_path: str, url_prefix: Optional[str]) -> List[Tuple[str, str, Optional[str]]]:
+        """Lists (file path, relative file path, url) of all files under directory_path in sorted order."""
+        files = []
+        for file_path in sorted(get_files_recursively(directory_path)):
             if os.path.isfile(file_path):
                 # get relpath
                 url_path = None
@@ -219,23 +378,155 @@ class TextChunker:
                 if url_prefix:
                     url_path = url_prefix + rel_file_path
                     url_path = convert_escaped_to_posix(url_path)
-                try:
-                    result = self.chunk_file(
-                        file_path,
-                        ignore_errors=ignore_errors,
-                        num_tokens=num_tokens,
-                        min_chunk_size=min_chunk_size,
-                        url=url_path,
-                        token_overlap=token_overlap
-                    )
-                    for chunk_idx, chunk_doc in enumerate(result):
-                        chunk_doc.filepath = rel_file_path
-                        chunk_doc.metadata = json.dumps({"chunk_id": str(chunk_idx)})
-                    chunks.extend(chunks)
-                except Exception as e:
-                    if not ignore_errors:
-                        raise
-                    # There's no logging yet
-                    # logging.warning(f"File ({file_path}) failed with ", e)
+                files.append((file_path, rel_file_path, url_path))
+        return files
 
-        return chunks
+    def _iter_chunk_files(
+        self,
+        files: List[Tuple[str, str, Optional[str]]],
+        ignore_errors: bool,
+        chunk_kwargs: Dict[str, Any],
+        num_workers: int,
+        failures: Optional[List[Tuple[str, Exception]]]
+    ) -> Generator[Tuple[str, List[Document]], None, None]:
+        if num_workers == 1:
+            results = (
+                _chunk_directory_file(self, file_path, rel_file_path, url_path, ignore_errors, chunk_kwargs)
+                for file_path, rel_file_path, url_path in files
+            )
+            yield from self._collect_results(results, files, ignore_errors, failures)
+        else:
+            num_workers = num_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_worker,
+                initargs=(self._version, self._extensions)
+            ) as executor:
+                results = _map_in_order(
+                    executor,
+                    _chunk_directory_file_in_worker,
+                    [(file_path, rel_file_path, url_path, ignore_errors, chunk_kwargs)
+                     for file_path, rel_file_path, url_path in files],
+                    max_in_flight=2 * num_workers
+                )
+                yield from self._collect_results(results, files, ignore_errors, failures)
+
+    def _collect_results(
+        self,
+        results: Iterable[Tuple[List[Document], Optional[Exception]]],
+        files: List[Tuple[str, str, Optional[str]]],
+        ignore_errors: bool,
+        failures: Optional[List[Tuple[str, Exception]]]
+    ) -> Generator[Tuple[str, List[Document]], None, None]:
+        num_failed = 0
+        for (_, rel_file_path, _), (file_chunks, error) in zip(files, tqdm.tqdm(results, total=len(files))):
+            if error is not None:
+                if not ignore_errors:
+                    raise error
+                num_failed += 1
+                if failures is not None:
+                    failures.append((rel_file_path, error))
+                continue
+            yield rel_file_path, file_chunks
+        if num_failed > 0:
+            print(f"Failed to chunk {num_failed} of {len(files)} files")
+
+
+def _hash_file(file_path: str) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _chunk_store_path(store_path: str, rel_file_path: str) -> str:
+    file_key = hashlib.sha1(convert_escaped_to_posix(rel_file_path).encode("utf-8")).hexdigest()
+    return os.path.join(store_path, TextChunker.CHUNK_STORE_DIR, f"{file_key}.json")
+
+
+def _load_manifest(manifest_path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf8") as f:
+        manifest = json.load(f)
+    return {entry["path"]: entry for entry in manifest.get("files", [])}
+
+
+def _save_manifest(manifest_path: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf8") as f:
+        json.dump({"files": list(manifest.values())}, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def _load_chunks(store_path: str, rel_file_path: str) -> Optional[List[Document]]:
+    try:
+        with open(_chunk_store_path(store_path, rel_file_path), "r", encoding="utf8") as f:
+            return [Document(**chunk) for chunk in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _save_chunks(store_path: str, rel_file_path: str, chunks: List[Document]) -> None:
+    with open(_chunk_store_path(store_path, rel_file_path), "w", encoding="utf8") as f:
+        json.dump([dataclass_to_dict(chunk) for chunk in chunks], f)
+
+
+def _delete_chunks(store_path: str, rel_file_path: str) -> None:
+    try:
+        os.remove(_chunk_store_path(store_path, rel_file_path))
+    except FileNotFoundError:
+        pass
+
+
+def _chunk_directory_file(
+    chunker: TextChunker,
+    file_path: str,
+    rel_file_path: str,
+    url_path: Optional[str],
+    ignore_errors: bool,
+    chunk_kwargs: Dict[str, Any]
+) -> Tuple[List[Document], Optional[Exception]]:
+    """Chunks one file of a directory, returning its chunks or the error that stopped it."""
+    try:
+        result = chunker.chunk_file(file_path, ignore_errors=False, url=url_path, **chunk_kwargs)
+    except UnsupportedFormatError as e:
+        # unsupported files are skipped, not failures
+        if ignore_errors:
+            return [], None
+        return [], e
+    except Exception as e:
+        return [], e
+    for chunk_idx, chunk_doc in enumerate(result):
+        chunk_doc.filepath = rel_file_path
+        chunk_doc.metadata = json.dumps({"chunk_id": str(chunk_idx)})
+    return result, None
+
+
+_WORKER_CHUNKER: Optional[TextChunker] = None
+
+
+def _init_worker(version: str, extensions_to_process: Optional[List[str]]) -> None:
+    global _WORKER_CHUNKER
+    _WORKER_CHUNKER = TextChunker(version=version, extensions_to_process=extensions_to_process)
+
+
+def _chunk_directory_file_in_worker(args: Tuple) -> Tuple[List[Document], Optional[Exception]]:
+    return _chunk_directory_file(_WORKER_CHUNKER, *args)
+
+
+def _map_in_order(executor: ProcessPoolExecutor, fn, args_list: List[Tuple], max_in_flight: int) -> Generator[Any, None, None]:
+    """Like executor.map, but submits lazily so at most max_in_flight results are held at once."""
+    pending = deque()
+    args_iter = iter(args_list)
+    for args in args_iter:
+        pending.append(executor.submit(fn, args))
+        if len(pending) >= max_in_flight:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for args in args_iter:
+            pending.append(executor.submit(fn, args))
+            break
+        yield result
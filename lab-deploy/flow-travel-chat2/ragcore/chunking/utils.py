@@ -1,10 +1,9 @@
-import tiktoken
 from typing import List, Dict, Any, Generator, Optional, Tuple
 from ragcore.utils import TokenEstimator
 from ragcore.datamodels.datamodels_utils import dataclass_to_dict
 from ragcore.datamodels.document import Document
 from ragcore.parsers.parser_factory import ParserFactory
-from ragcore.chunking import MarkdownTextSplitter, CSVChunker, PdfChunker, PythonCodeTextSplitter, RecursiveCharacterTextSplitter
+from ragcore.chunking import MarkdownTextSplitter, CSVChunker, PdfChunker, PythonCodeTextSplitter, TokenOffsetTextSplitter
 
 SENTENCE_ENDINGS = [".", "!", "?"]
 WORDS_BREAKS = list(
@@ -41,26 +40,24 @@ def chunk_content_helper_v2(
     elif file_format in {'csv'} and file_name:
         splitter = CSVChunker()
         chunked_docs = splitter.split_text(content, file_name, token_limit=num_tokens)
-        for chunk_doc in chunked_docs:
-            chunk_size = TOKEN_ESTIMATOR.estimate_tokens(chunk_doc.content)
+        chunk_sizes = TOKEN_ESTIMATOR.count_tokens_batch([chunk_doc.content for chunk_doc in chunked_docs]).tolist()
+        for chunk_doc, chunk_size in zip(chunked_docs, chunk_sizes):
             yield chunk_doc.content, chunk_size, chunk_doc
     elif file_format == "pdf" and use_fr:
         splitter = PdfChunker()
         chunked_content_list = splitter.split_text(doc.content, token_limit=num_tokens, chunk_overlap=token_overlap)
-        for chunked_content in chunked_content_list:
-            chunk_size = TOKEN_ESTIMATOR.estimate_tokens(chunked_content)
+        for chunked_content, chunk_size in zip(chunked_content_list, TOKEN_ESTIMATOR.count_tokens_batch(chunked_content_list).tolist()):
             yield chunked_content, chunk_size, doc
     else:
         if file_format == "python":
             splitter = PythonCodeTextSplitter(keep_separator=False)
             chunked_content_list = splitter.split_text(doc.content, token_limit=num_tokens, chunk_overlap=token_overlap)
         else:
-            splitter = RecursiveCharacterTextSplitter(
+            splitter = TokenOffsetTextSplitter(
                 separators=SENTENCE_ENDINGS + WORDS_BREAKS, keep_separator=False)
             chunked_content_list = splitter.split_text(doc.content, token_limit=num_tokens, chunk_overlap=token_overlap)
         
-        for chunked_content in chunked_content_list:
-            chunk_size = TOKEN_ESTIMATOR.estimate_tokens(chunked_content)
+        for chunked_content, chunk_size in zip(chunked_content_list, TOKEN_ESTIMATOR.count_tokens_batch(chunked_content_list).tolist()):
             yield chunked_content, chunk_size, doc
 
 
@@ -78,7 +75,7 @@ def chunk_content_helper_v1(
     """
     parser = parser_factory(file_format)
     doc = parser.parse(content, file_name=file_name)
-    enc = tiktoken.get_encoding("gpt2")
+    enc = TokenEstimator.GPT2_TOKENIZER
     this_chunk = ""
     this_chunksize = 0
     for line in doc.content.split("\n"):
@@ -96,8 +93,7 @@ def merge_chunks_serially(chunked_content_list: List[str], num_tokens: int) -> G
     # TODO: solve for token overlap
     current_chunk = ""
     total_size = 0
-    for chunked_content in chunked_content_list:
-        chunk_size = TOKEN_ESTIMATOR.estimate_tokens(chunked_content)
+    for chunked_content, chunk_size in zip(chunked_content_list, TOKEN_ESTIMATOR.count_tokens_batch(chunked_content_list).tolist()):
         if total_size > 0:
             new_size = total_size + chunk_size
             if new_size > num_tokens:
@@ -1,3 +1,3 @@
 from ragcore.datamodels.document import Document
 from ragcore.datamodels.search_result import SearchResult
-from ragcore.datamodels.datamodels_utils import dataclass_to_dict, results_list_to_docs_list
\ No newline at end of file
+from ragcore.datamodels.datamodels_utils import dataclass_to_dict, dataclass_from_dict, results_list_to_docs_list
\ No newline at end of file
@@ -1,13 +1,46 @@
-from dataclasses import fields, dataclass
+from dataclasses import fields, dataclass, is_dataclass
+from operator import attrgetter
 from ragcore.datamodels.document import Document
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Tuple, Type, TypeVar, get_type_hints
+
+T = TypeVar("T")
+
+# Per dataclass: field names, a getter returning all field values at once and the
+# dataclass types of nested fields, resolved once instead of on every conversion.
+_CONVERTERS: Dict[type, Tuple[Tuple[str, ...], Callable[[Any], Tuple[Any, ...]], Dict[str, type]]] = {}
+
+def _get_converter(cls: type) -> Tuple[Tuple[str, ...], Callable[[Any], Tuple[Any, ...]], Dict[str, type]]:
+    converter = _CONVERTERS.get(cls)
+    if converter is None:
+        names = tuple(field.name for field in fields(cls))
+        if len(names) > 1:
+            getter = attrgetter(*names)
+        else:
+            # attrgetter returns a bare value for a single name
+            getter = lambda obj: tuple(getattr(obj, name) for name in names)
+        type_hints = get_type_hints(cls)
+        nested = {name: type_hints[name] for name in names if is_dataclass(type_hints.get(name))}
+        converter = _CONVERTERS[cls] = (names, getter, nested)
+    return converter
 
 def dataclass_to_dict(obj: dataclass) -> Dict[str, Any]:
-    return {field.name: getattr(obj, field.name) for field in fields(obj)}
+    """Shallow conversion of a dataclass instance to a dict, nested dataclasses are kept as is."""
+    names, getter, _ = _get_converter(type(obj))
+    return dict(zip(names, getter(obj)))
+
+def dataclass_from_dict(cls: Type[T], obj: Dict[str, Any]) -> T:
+    """Creates a dataclass instance from a dict, nested dataclass fields may be given as dicts."""
+    _, _, nested = _get_converter(cls)
+    if nested:
+        obj = dict(obj)
+        for name, nested_cls in nested.items():
+            if isinstance(obj.get(name), dict):
+                obj[name] = dataclass_from_dict(nested_cls, obj[name])
+    return cls(**obj)
 
 def results_list_to_docs_list(obj: List[List[Dict[str, Any]]]) -> List[List[Document]]:
     """Transforms json results to Document objects"""
     docs_list: List[List[Document]] = []
     for list in obj:
         docs_list.append([Document(**doc) for doc in list])
-    return docs_list
\ No newline at end of file
+    return docs_list
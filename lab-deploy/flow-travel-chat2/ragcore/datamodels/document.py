@@ -5,9 +5,9 @@ Classes:
 
 """
 from typing import Optional
-from dataclasses import dataclass
+from ragcore.datamodels.slots import slotted_dataclass
 
-@dataclass
+@slotted_dataclass
 class Document(object):
     """
         Data class for chunked documents
@@ -9,4 +9,9 @@ class QueryType(Enum):
     
 class DataSourceType(Enum):
     ACS = 'acs'
-    COSMOS = 'cosmos'
\ No newline at end of file
+    COSMOS = 'cosmos'
+
+class ExecutionMode(Enum):
+    SERIAL = 'serial'
+    THREAD = 'thread'
+    PROCESS = 'process'
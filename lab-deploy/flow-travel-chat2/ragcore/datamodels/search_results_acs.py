@@ -5,10 +5,10 @@ Classes:
     Metadata: Data class for metadata in SearchResultsACS
 """
 
-from dataclasses import dataclass
+from ragcore.datamodels.slots import slotted_dataclass
 from typing import Optional, List
 
-@dataclass
+@slotted_dataclass(frozen=True)
 class Metadata(object):
     search_score: Optional[float] = None
     search_reranker_score: Optional[float] = None
@@ -18,7 +18,7 @@ class Metadata(object):
     chunk_id: Optional[str] = None
     title: Optional[str] = None
 
-@dataclass
+@slotted_dataclass(frozen=True)
 class SearchResultsACS(object):
     metadata: Metadata
     score: float = 0
@@ -4,12 +4,12 @@ Classes:
     SearchResultsCosmosVector: Data class for Search results from Cosmos using Vector search
 """
 
-from dataclasses import dataclass
+from ragcore.datamodels.slots import slotted_dataclass
 from typing import Optional, Any, Dict
 
-@dataclass
+@slotted_dataclass(frozen=True)
 class SearchResultsCosmosVector(object):
-    chunk_id: str = None,
+    chunk_id: str = None
     id: str = None
     title: str = ""
     content: str = ""
@@ -0,0 +1,18 @@
+"""Slotted dataclasses
+
+Functions:
+    slotted_dataclass: dataclass decorator that adds __slots__ where supported
+"""
+import sys
+from dataclasses import dataclass
+
+def slotted_dataclass(cls=None, **kwargs):
+    """Same as @dataclass, but instances use __slots__ instead of a per-instance __dict__.
+
+    Slots need Python 3.10, older versions get a regular dataclass.
+    """
+    if sys.version_info >= (3, 10):
+        kwargs["slots"] = True
+    if cls is None:
+        return dataclass(**kwargs)
+    return dataclass(cls, **kwargs)
@@ -1,34 +1,75 @@
-from typing import List, Dict, Tuple, Any
-from ragcore.datamodels import Document, dataclass_to_dict, results_list_to_docs_list
+import heapq
+from dataclasses import MISSING, fields
+from typing import List, Dict, Tuple, Any, Optional
+from ragcore.datamodels import Document
 
-def select_chunks_core(results: List[List[Dict[str, Any]]], top_k: int, min_score: float = None) -> List:
-  RRF_CONST = 60
-  chunk_rrf: Dict[str, Tuple[float, Document]] = {}
+RRF_CONST = 60
+# Chunks are returned with the fields of the Document dataclass, in the same order.
+DOCUMENT_DEFAULTS: Dict[str, Any] = {
+  field.name: None if field.default is MISSING else field.default for field in fields(Document)
+}
 
-  results: List[List[Document]] = results_list_to_docs_list(results)
+class ReciprocalRankFusion(object):
+  """Streaming, weighted Reciprocal Rank Fusion of ranked chunk lists.
 
-  # Loop through results from each query
-  for list in results:
+  Chunk lists are added one at a time, e.g. one per query, and each chunk gets
+  weight / (rank + rrf_const) added to its fused score. Chunks work directly on
+  the dict form of Document and are keyed by the 64 bit hash of their title,
+  filepath and content, the same fields Document.__eq__ compares, so only the
+  hash is kept per chunk and strings are compared only when the hashes match.
+  top() selects the best chunks with a heap instead of sorting all of them.
+  """
+  def __init__(self, rrf_const: int = RRF_CONST, min_score: float = None):
+    self.rrf_const = rrf_const
+    self.min_score = min_score
+    # chunk hash -> [fused score, last seen chunk]
+    self._chunk_rrf: Dict[Any, List] = {}
+
+  @staticmethod
+  def chunk_fields(chunk: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    return (chunk.get('title'), chunk.get('filepath'), chunk.get('content'))
+
+  def add(self, chunks: List[Dict[str, Any]], weight: float = 1.0) -> None:
     # The default value for score was set to 1 in the previous version of the code for this method. 
     # Although, service doesn't has that default value, it is not necessary to set it here.
-    sorted_chunks: List[Document] = sorted(list, key=lambda x: x.score, reverse=True)
-    for [rank, chunk] in enumerate(sorted_chunks, start=1):
-      if min_score and chunk.score < min_score:
+    sorted_chunks = sorted(chunks, key=lambda x: x.get('score'), reverse=True)
+    for rank, chunk in enumerate(sorted_chunks, start=1):
+      if self.min_score and chunk.get('score') < self.min_score:
         continue
-      chunk_key = ( chunk.title, chunk.filepath, chunk.content )
-      rrf = chunk_rrf.get(chunk_key, (0, None))[0] + 1.0 / (rank + RRF_CONST)
-      chunk_rrf[chunk_key] = (rrf, chunk )
+      chunk_fields = self.chunk_fields(chunk)
+      chunk_key = hash(chunk_fields)
+      entry = self._chunk_rrf.get(chunk_key)
+      if entry is not None and self.chunk_fields(entry[1]) != chunk_fields:
+        # Hash collision, key this chunk by its fields instead
+        chunk_key = chunk_fields
+        entry = self._chunk_rrf.get(chunk_key)
+      if entry is None:
+        self._chunk_rrf[chunk_key] = [weight / (rank + self.rrf_const), chunk]
+      else:
+        entry[0] += weight / (rank + self.rrf_const)
+        entry[1] = chunk
+
+  def ranked(self, top_k: int) -> List[Tuple[float, Dict[str, Any]]]:
+    """Returns (fused score, last seen chunk) of the top_k chunks, best first."""
+    # nlargest keeps the insertion order of ties, like a stable sort.
+    # At least one chunk is returned, even for top_k <= 0.
+    return heapq.nlargest(max(top_k, 1), self._chunk_rrf.values(), key=lambda entry: entry[0])
+
+  def top(self, top_k: int) -> List[Dict[str, Any]]:
+    """Returns the top_k chunks by fused score, with the fused score as their score."""
+    new_results: List[Dict[str, Any]] = []
+    for rrf, chunk in self.ranked(top_k):
+      new_chunk = {name: chunk.get(name, default) for name, default in DOCUMENT_DEFAULTS.items()}
+      new_chunk['score'] = rrf
+      new_results.append(new_chunk)
+    return new_results
+
+def select_chunks_core(results: List[List[Dict[str, Any]]], top_k: int, min_score: float = None, weights: Optional[List[float]] = None) -> List:
+  fusion = ReciprocalRankFusion(min_score=min_score)
+
+  # Loop through results from each query
+  for query_index, chunks in enumerate(results):
+    fusion.add(chunks, weight=weights[query_index] if weights else 1.0)
 
-  sorted_by_rrf = sorted(chunk_rrf.items(), key=lambda x: x[1][0], reverse=True)
-  
   # The structure of the results should follow the structure of the Document dataclass
-  new_results: List[Dict[str, Any]] = []
-  
-  for _, (rrf, chunk) in sorted_by_rrf:
-    # Convert Document to dictionaries
-    new_chunk = dataclass_to_dict(chunk)
-    new_chunk['score'] = rrf
-    new_results.append(new_chunk)
-    if len(new_results) >= top_k:
-      break
-  return new_results
\ No newline at end of file
+  return fusion.top(top_k)
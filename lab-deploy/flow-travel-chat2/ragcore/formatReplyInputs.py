@@ -1,5 +1,5 @@
 from typing import List
-from ragcore.utils import clip_text, make_valid_json, get_conversation_text, TokenEstimator
+from ragcore.utils import clip_text, get_conversation_text, TokenEstimator
 import json
 
 MAX_TURN_TOKENS = 1000
@@ -23,22 +23,46 @@ def format_generate_reply_inputs_core(query: str, history: List, chunks: List, m
     'documentation': documentation
   }
 
+DOCS_PREFIX = '{"retrieved_documents": ['
+DOCS_SUFFIX = ']}'
+DOCS_SEPARATOR = ', '
+
 def get_documentation_text(chunks: List, max_tokens: int) -> str:
-  # Convert chunks into JSON string.
-  chunks_list = []
+  # Serialize chunks one by one against the token budget, the same JSON as
+  # json.dumps({'retrieved_documents': [...]}) but without the chunks that do not fit.
+  budget = max_tokens - TOKEN_ESTIMATOR.estimate_tokens(text=DOCS_PREFIX) - TOKEN_ESTIMATOR.estimate_tokens(text=DOCS_SUFFIX)
+  docs_parts = []
   for chunk_index in range(len(chunks)):
     chunk = chunks[chunk_index]
-    chunk_text = {
-      f'[doc{chunk_index + 1}]': {
-        'title': chunk.get('title', ''),
-        'content': chunk['content']
-      }
-    }
-    chunks_list.append(chunk_text)
-  docs_obj = { 'retrieved_documents': chunks_list }
-  docs_text = json.dumps(docs_obj)
-
-  # Clip string and verify still valid JSON.
-  docs_text = clip_text(docs_text, max_tokens)
-  docs_text = make_valid_json(docs_text)
-  return docs_text
+    key = f'[doc{chunk_index + 1}]'
+    title = chunk.get('title', '')
+    separator = DOCS_SEPARATOR if docs_parts else ''
+    chunk_text = separator + json.dumps({key: {'title': title, 'content': chunk['content']}})
+    chunk_tokens = TOKEN_ESTIMATOR.estimate_tokens(text=chunk_text)
+    if chunk_tokens <= budget:
+      docs_parts.append(chunk_text)
+      budget -= chunk_tokens
+      continue
+
+    # Only the content of the last chunk is clipped.
+    chunk_text = clip_chunk_text(separator, key, title, chunk['content'], budget)
+    if chunk_text:
+      docs_parts.append(chunk_text)
+    break
+  return DOCS_PREFIX + ''.join(docs_parts) + DOCS_SUFFIX
+
+def clip_chunk_text(separator: str, key: str, title: str, content: str, max_tokens: int) -> str:
+  """Serializes a chunk with its content clipped to fit max_tokens, '' if not even the title fits."""
+  empty_chunk_tokens = TOKEN_ESTIMATOR.estimate_tokens(text=separator + json.dumps({key: {'title': title, 'content': ''}}))
+  content_tokens = max_tokens - empty_chunk_tokens
+  if content_tokens <= 0:
+    return ''
+  content_ids = TOKEN_ESTIMATOR.GPT2_TOKENIZER.encode(content, allowed_special='all')
+  # Escaping can add tokens, shrink the clipped content until the serialized chunk fits.
+  while content_tokens > 0:
+    chunk_text = separator + json.dumps({key: {'title': title, 'content': TOKEN_ESTIMATOR.GPT2_TOKENIZER.decode(content_ids[:content_tokens])}})
+    excess_tokens = TOKEN_ESTIMATOR.estimate_tokens(text=chunk_text) - max_tokens
+    if excess_tokens <= 0:
+      return chunk_text
+    content_tokens -= excess_tokens
+  return ''
@@ -0,0 +1,44 @@
+"""Deferred imports of heavy dependencies.
+
+Every promptflow node imports ragcore on a cold start, while most nodes only need a few pure
+Python helpers. numpy, pandas, scikit-learn, scipy, langdetect, BeautifulSoup, markdown and
+tiktoken are therefore imported when they are first used rather than when ragcore is imported.
+"""
+import importlib
+from typing import Any
+
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is first accessed.
+
+    Usage mirrors a plain import, e.g. np = LazyModule("numpy") followed by np.zeros(3). Resolved
+    attributes are cached on the proxy, so later accesses are plain attribute lookups. Modules
+    that are only used for annotations need a "from __future__ import annotations" in the
+    importing module, as annotations would otherwise trigger the import.
+    """
+
+    def __init__(self, name: str):
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("_lazy_"):
+            raise AttributeError(attr)
+        value = getattr(self._lazy_load(), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._lazy_module is not None else "not loaded"
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+    def _lazy_load(self):
+        module = self._lazy_module
+        if module is None:
+            # the import lock makes concurrent first accesses import the module once
+            module = self._lazy_module = importlib.import_module(self._lazy_name)
+        return module
+
@@ -1,5 +1,5 @@
 "Parser factory for using parsers"
-from typing import List
+from typing import Dict, List, Optional, Type
 from ragcore.parsers.base_parser import BaseParser
 from ragcore.parsers.parsers import (
     HTMLParser,
@@ -12,27 +12,36 @@ from ragcore.exceptions import UnsupportedFormatError
 
 
 class ParserFactory:
+    PARSER_CLASSES: Dict[str, Type[BaseParser]] = {
+        "html": HTMLParser,
+        "text": TextParser,
+        "markdown": MarkdownParser,
+        "python": PythonParser,
+        "csv": CSVParser
+    }
+
     def __init__(self):
-        self._parsers = {
-            "html": HTMLParser(),
-            "text": TextParser(),
-            "markdown": MarkdownParser(),
-            "python": PythonParser(),
-            "csv": CSVParser()
-        }
+        # parsers are created on first use, so that building a factory stays cheap
+        self._parsers: Dict[str, BaseParser] = {}
 
     @property
     def supported_formats(self) -> List[str]:
         "Returns a list of supported formats"
-        return list(self._parsers.keys())
+        return list(self.PARSER_CLASSES.keys())
 
-    def __call__(self, file_format: str, use_fr: bool = False) -> BaseParser:
+    def _get_parser(self, file_format: str) -> Optional[BaseParser]:
         parser = self._parsers.get(file_format, None)
+        if parser is None and file_format in self.PARSER_CLASSES:
+            parser = self._parsers.setdefault(file_format, self.PARSER_CLASSES[file_format]())
+        return parser
+
+    def __call__(self, file_format: str, use_fr: bool = False) -> BaseParser:
+        parser = self._get_parser(file_format)
         if file_format == "pdf":
             if use_fr:
-                parser = self._parsers.get("html", None)
+                parser = self._get_parser("html")
             else:
-                parser = self._parsers.get("text", None)
+                parser = self._get_parser("text")
         if parser is None:
             raise UnsupportedFormatError(f"{file_format} is not supported")
 
@@ -1,13 +1,15 @@
 "Contains concrete implementations of parsers for different formats."
-import markdown
 from typing import Optional
-from bs4 import BeautifulSoup
 import ast
 from ragcore.datamodels.document import Document
+from ragcore.lazy import LazyModule
 from ragcore.parsers.base_parser import BaseParser
 from ragcore.parsers.text_utils import cleanup_content
 from ragcore.utils import TokenEstimator
 
+markdown = LazyModule("markdown")
+bs4 = LazyModule("bs4")
+
 
 class MarkdownParser(BaseParser):
     """Parses Markdown content."""
@@ -50,7 +52,7 @@ class HTMLParser(BaseParser):
         Returns:
             Document: The parsed document.
         """
-        soup = BeautifulSoup(content, 'html.parser')
+        soup = bs4.BeautifulSoup(content, 'html.parser')
 
         # Extract the title
         title = ''
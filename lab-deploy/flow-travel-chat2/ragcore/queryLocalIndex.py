@@ -0,0 +1,19 @@
+from typing import List, Dict, Any, Optional
+from ragcore.datamodels.enums import QueryType
+from ragcore.retrieval import get_search_index
+
+def query_local_index_core(queries: List[str], index_path: str, top_k: int, query_type: QueryType = QueryType.VECTOR.value,
+                           query_vectors: Optional[List[List[float]]] = None, nprobe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+  """
+  Retrieve documents from a local search index, as the querySearchResource node does from Azure AI Search.
+  @param queries: current search intents
+  @param index_path: Directory of an index saved with LocalSearchIndex.save or LocalVectorIndex.save
+  @param top_k: number of search results per query
+  @param query_type: Value can be "simple", "semantic", "vector", "vector_simple_hybrid" or "vector_semantic_hybrid".
+                     Semantic queries are ranked without the semantic ranker.
+  @param query_vectors: Embeddings of the queries, of the model the index was built with. Needed by vector and hybrid queries.
+  @param nprobe: Number of IVF clusters scanned per query, if the index has an IVF index
+
+  @return: List of raw documents per query, in the shape of the querySearchResource results
+  """
+  return get_search_index(index_path).search_raw_docs(queries, query_type, top_k, query_vectors=query_vectors, nprobe=nprobe)
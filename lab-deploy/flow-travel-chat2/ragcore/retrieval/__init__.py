@@ -0,0 +1,3 @@
+from ragcore.retrieval.vector_index import IVFIndex, LocalVectorIndex, get_index
+from ragcore.retrieval.bm25 import BM25Index
+from ragcore.retrieval.hybrid import LocalSearchIndex, get_search_index
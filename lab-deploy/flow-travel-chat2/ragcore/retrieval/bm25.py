@@ -0,0 +1,177 @@
+""" Local BM25 keyword index
+
+An inverted index over the text of the chunks, e.g. as produced by TextChunker, ranking them
+with Okapi BM25. Words are lowercased and split like the TF-IDF reranker of ragcore.utils does,
+and the stop words of the index language, from stopwords.jsonl, are left out.
+
+The postings are kept in CSR form: the rows and impacts of term i are rows[offsets[i]:offsets[i + 1]]
+and impacts[offsets[i]:offsets[i + 1]], where the impact is the length-normalized BM25 term
+frequency weight of the row, computed once when the index is built. A query then only adds up
+idf * impact over the postings of its terms. The arrays are saved as .npy files and memory-mapped
+on load, so loading an index only reads its vocabulary.
+
+Classes:
+    BM25Index: Inverted BM25 index over a list of texts
+"""
+from __future__ import annotations
+import json
+import os
+import re
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+from ragcore.lazy import LazyModule
+from ragcore.retrieval.vector_index import top_k_rows
+from ragcore.utils import get_stop_words
+
+np = LazyModule("numpy")
+
+BM25_MANIFEST_FILE = "bm25.json"
+BM25_TERMS_FILE = "bm25_terms.txt"
+BM25_OFFSETS_FILE = "bm25_offsets.npy"
+BM25_ROWS_FILE = "bm25_rows.npy"
+BM25_IMPACTS_FILE = "bm25_impacts.npy"
+BM25_IDF_FILE = "bm25_idf.npy"
+
+# same tokens as the default token_pattern of the scikit-learn vectorizers
+TOKEN_REGEX = re.compile(r"(?u)\b\w\w+\b")
+NON_SPACE_SEPARATED_LANGS = ['zh', 'ja', 'ko', 'th', 'vi']
+
+class BM25Index(object):
+    """Okapi BM25 over a list of texts, one row per text.
+
+    Usage:
+        index = BM25Index.build([chunk.content for chunk in chunks], lang="en")
+        results = index.search(["hotels near the beach"], top_k=5)
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, rows: np.ndarray, impacts: np.ndarray, idf: np.ndarray,
+                 num_rows: int, lang: str = "en", k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.rows = rows
+        self.impacts = impacts
+        self.idf = idf
+        self.num_rows = num_rows
+        self.lang = lang
+        self.k1 = k1
+        self.b = b
+        self._stop_words = frozenset(get_stop_words().get(lang, ()))
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    @staticmethod
+    def analyze(text: str, lang: str = "en", stop_words: Iterable[str] = ()) -> List[str]:
+        """Terms of a text: its lowercased words, or characters for languages not separated by
+        spaces, without stop words."""
+        text = text.lower()
+        words = [char for char in text if char.isalnum()] if lang in NON_SPACE_SEPARATED_LANGS else TOKEN_REGEX.findall(text)
+        return [word for word in words if word not in stop_words]
+
+    @classmethod
+    def build(cls, texts: Iterable[str], lang: str = "en", k1: float = 1.2, b: float = 0.75) -> BM25Index:
+        """Indexes texts, row i being the i-th text.
+        @param texts: Texts to index, e.g. the content of the chunks
+        @param lang: Language of the stop word list, falls back to "en" when there is none
+        @param k1: BM25 term frequency saturation
+        @param b: BM25 length normalization
+        """
+        if lang not in get_stop_words():
+            lang = "en"
+        stop_words = frozenset(get_stop_words()[lang])
+        vocabulary = {}
+        row_ids: List[int] = []
+        term_ids: List[int] = []
+        term_counts: List[int] = []
+        row_lengths: List[int] = []
+        for row, text in enumerate(texts):
+            counts = Counter(cls.analyze(text, lang, stop_words))
+            row_ids.extend([row] * len(counts))
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            term_counts.extend(counts.values())
+            row_lengths.append(sum(counts.values()))
+
+        num_rows = len(row_lengths)
+        row_ids = np.array(row_ids, dtype=np.int32)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        term_counts = np.array(term_counts, dtype=np.float64)
+        row_lengths = np.array(row_lengths, dtype=np.float64)
+        average_length = row_lengths.mean() if num_rows and row_lengths.any() else 1.0
+
+        # postings were collected row by row, a stable sort by term keeps the rows of every term ascending
+        order = np.argsort(term_ids, kind="stable")
+        doc_freq = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+        idf = np.log(1 + (num_rows - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        counts = term_counts[order]
+        norms = k1 * (1 - b + b * row_lengths[row_ids[order]] / average_length)
+        impacts = (counts * (k1 + 1) / (counts + norms)).astype(np.float32)
+        return cls(list(vocabulary), offsets, row_ids[order], impacts, idf, num_rows, lang=lang, k1=k1, b=b)
+
+    def save(self, path: str) -> None:
+        """Saves the index to a directory, which is created if needed."""
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, BM25_TERMS_FILE), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.terms))
+        np.save(os.path.join(path, BM25_OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(path, BM25_ROWS_FILE), self.rows)
+        np.save(os.path.join(path, BM25_IMPACTS_FILE), self.impacts)
+        np.save(os.path.join(path, BM25_IDF_FILE), self.idf)
+        manifest = {"count": self.num_rows, "num_terms": len(self.terms), "lang": self.lang, "k1": self.k1, "b": self.b}
+        with open(os.path.join(path, BM25_MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> BM25Index:
+        """Loads an index saved with save.
+        @param path: Directory of the index
+        @param mmap: If true, the postings are memory-mapped read-only instead of read
+        """
+        with open(os.path.join(path, BM25_MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, BM25_TERMS_FILE), encoding="utf-8") as f:
+            terms = f.read().split("\n") if manifest["num_terms"] else []
+        mmap_mode = "r" if mmap else None
+        return cls(
+            terms,
+            np.load(os.path.join(path, BM25_OFFSETS_FILE)),
+            np.load(os.path.join(path, BM25_ROWS_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, BM25_IMPACTS_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, BM25_IDF_FILE)),
+            manifest["count"], lang=manifest["lang"], k1=manifest["k1"], b=manifest["b"]
+        )
+
+    def query_terms(self, query: str) -> List[int]:
+        """Distinct vocabulary ids of the terms of a query, terms missing from the index left out."""
+        term_ids = (self.vocabulary.get(term) for term in dict.fromkeys(self.analyze(query, self.lang, self._stop_words)))
+        return [term_id for term_id in term_ids if term_id is not None]
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 scores of the rows that contain at least one term of the query.
+        @returns The rows, in ascending order, and their scores"""
+        scores = np.zeros(self.num_rows, dtype=np.float32)
+        matched = np.zeros(self.num_rows, dtype=bool)
+        for term_id in self.query_terms(query):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.rows[start:end]
+            # the rows of a term are distinct, so fancy indexing adds every posting once
+            scores[rows] += self.idf[term_id] * self.impacts[start:end]
+            matched[rows] = True
+        rows = np.flatnonzero(matched)
+        return rows, scores[rows]
+
+    def search(self, queries: List[str], top_k: int) -> List[List[Tuple[int, float]]]:
+        """Finds the rows with the highest BM25 score for each query.
+        @param queries: Keyword queries
+        @param top_k: Number of rows per query
+        @returns Per query, (row, BM25 score) tuples, best first. Rows matching none of the terms
+            of a query are not returned.
+        """
+        results = []
+        for query in queries:
+            rows, scores = self.scores(query)
+            top = top_k_rows(scores, top_k) if top_k > 0 else []
+            results.append(list(zip(rows[top].tolist(), scores[top].tolist())))
+        return results
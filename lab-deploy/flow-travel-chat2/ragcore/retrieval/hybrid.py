@@ -0,0 +1,170 @@
+""" Local keyword, vector and hybrid search
+
+Answers the query types of the flow (QueryType) locally, from a directory holding the documents,
+a BM25Index over their content and title, and, when the documents carry embeddings, a
+LocalVectorIndex over those. Hybrid queries fuse the BM25 and vector rankings of the rows with
+Reciprocal Rank Fusion, with the constant of select_chunks_core. As Azure AI Search, which fuses
+by document key, rows are fused by index, so documents with the same text stay distinct. There is no local semantic ranker, so semantic
+queries are answered as keyword queries and semantic hybrid queries as hybrid queries.
+
+Classes:
+    LocalSearchIndex: Keyword, vector and hybrid search over a set of documents
+"""
+from __future__ import annotations
+import heapq
+import os
+import threading
+from dataclasses import asdict, is_dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from ragcore.datamodels import Document
+from ragcore.datamodels.enums import QueryType
+from ragcore.filterChunks import RRF_CONST
+from ragcore.retrieval.bm25 import BM25_MANIFEST_FILE, BM25Index
+from ragcore.retrieval.vector_index import (
+    CONTENT_FIELD, EMBEDDING_FIELD, MANIFEST_FILE, LocalVectorIndex, cosine_to_search_score, load_documents,
+    save_documents, to_raw_doc)
+
+# Rows retrieved by each of the rankings a hybrid query fuses, as Azure AI Search does
+HYBRID_CANDIDATES = 50
+
+KEYWORD_QUERY_TYPES = {QueryType.SIMPLE.value, QueryType.SEMANTIC.value}
+VECTOR_QUERY_TYPES = {QueryType.VECTOR.value}
+HYBRID_QUERY_TYPES = {QueryType.VECTOR_SIMPLE_HYBRID.value, QueryType.VECTOR_SEMANTIC_HYBRID.value}
+
+def keyword_text(document: Dict[str, Any]) -> str:
+    """Text of a document searched by keyword queries, its title and content."""
+    return "\n".join(filter(None, [document.get("title"), document.get(CONTENT_FIELD)]))
+
+def to_index_document(document: Union[Document, Dict[str, Any]], row: int) -> Dict[str, Any]:
+    """Fields of a chunk or search index document, with an id, the row, when it has none."""
+    if is_dataclass(document):
+        document = {field: value for field, value in asdict(document).items() if value is not None}
+        document.setdefault("id", str(document.pop("chunk_id", row)))
+    else:
+        document = dict(document)
+        document.setdefault("id", str(row))
+    return document
+
+class LocalSearchIndex(object):
+    """Keyword, vector and hybrid search over a set of documents.
+
+    Usage:
+        index = LocalSearchIndex.from_documents(TextChunker().chunk_directory("data"))
+        index.save("index-travel")
+        results = LocalSearchIndex.load("index-travel").search_raw_docs(queries, "simple", top_k=5)
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], keyword_index: BM25Index, vector_index: Optional[LocalVectorIndex] = None):
+        """
+        @param documents: Documents of the rows, without their embedding
+        @param keyword_index: BM25 index over the documents
+        @param vector_index: Vector index over the documents, if they have embeddings
+        """
+        if len(keyword_index) != len(documents) or (vector_index is not None and len(vector_index) != len(documents)):
+            raise ValueError("The keyword and vector indexes do not cover the same documents")
+        self.documents = documents
+        self.keyword_index = keyword_index
+        self.vector_index = vector_index
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Union[Document, Dict[str, Any]]], embedding_field: str = EMBEDDING_FIELD,
+                       lang: str = "en", ivf_nlist: Optional[int] = None) -> LocalSearchIndex:
+        """Builds an index from chunks or search index documents.
+        @param documents: Documents, e.g. the chunks of TextChunker or the output of create_docs_from_csv
+        @param embedding_field: Field holding the embedding of a document. A vector index is
+            built when every document has one.
+        @param lang: Language of the stop words left out of the keyword index
+        @param ivf_nlist: Number of IVF clusters of the vector index, see LocalVectorIndex
+        """
+        documents = [to_index_document(document, row) for row, document in enumerate(documents)]
+        vector_index = None
+        if documents and all(document.get(embedding_field) is not None for document in documents):
+            vector_index = LocalVectorIndex.from_documents(documents, embedding_field=embedding_field, ivf_nlist=ivf_nlist)
+            documents = vector_index.documents
+        keyword_index = BM25Index.build((keyword_text(document) for document in documents), lang=lang)
+        return cls(documents, keyword_index, vector_index)
+
+    def save(self, path: str) -> None:
+        """Saves the index to a directory, which is created if needed."""
+        if self.vector_index is not None:
+            self.vector_index.save(path)
+        else:
+            os.makedirs(path, exist_ok=True)
+            save_documents(path, self.documents)
+        self.keyword_index.save(path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> LocalSearchIndex:
+        """Loads an index saved with save, or a LocalVectorIndex, whose keyword index is then built."""
+        vector_index = LocalVectorIndex.load(path, mmap=mmap) if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+        documents = vector_index.documents if vector_index is not None else load_documents(path)
+        if os.path.exists(os.path.join(path, BM25_MANIFEST_FILE)):
+            keyword_index = BM25Index.load(path, mmap=mmap)
+        else:
+            keyword_index = BM25Index.build(keyword_text(document) for document in documents)
+        return cls(documents, keyword_index, vector_index)
+
+    def search(self, queries: List[str], query_type: str, top_k: int, query_vectors: Optional[List[List[float]]] = None,
+               nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Finds the best rows for each query.
+        @param queries: Query texts
+        @param query_type: Value can be "simple", "semantic", "vector", "vector_simple_hybrid" or "vector_semantic_hybrid"
+        @param top_k: Number of rows per query
+        @param query_vectors: Embeddings of the queries, needed by vector and hybrid queries
+        @param nprobe: Number of IVF clusters scanned per query, if the vector index has an IVF index
+        @returns Per query, (row, score) tuples, best first. Scores are scaled as the @search.score
+            of Azure AI Search: BM25 for keyword, 1 / (1 + cosine distance) for vector and the fused
+            reciprocal rank for hybrid queries.
+        """
+        if query_type in KEYWORD_QUERY_TYPES:
+            return self.keyword_index.search(queries, top_k)
+        if query_type not in VECTOR_QUERY_TYPES | HYBRID_QUERY_TYPES:
+            raise ValueError(f"Invalid query type: {query_type}")
+        if self.vector_index is None:
+            raise ValueError(f"A {query_type} query needs a vector index, the documents of this index have no embeddings")
+        if query_vectors is None or len(query_vectors) != len(queries):
+            raise ValueError(f"A {query_type} query needs one query vector per query")
+        if query_type in VECTOR_QUERY_TYPES:
+            return [
+                [(row, cosine_to_search_score(similarity)) for row, similarity in query_results]
+                for query_results in self.vector_index.search(query_vectors, top_k, nprobe=nprobe)
+            ]
+
+        num_candidates = max(top_k, HYBRID_CANDIDATES)
+        keyword_results = self.keyword_index.search(queries, num_candidates)
+        vector_results = self.vector_index.search(query_vectors, num_candidates, nprobe=nprobe)
+        results = []
+        for keyword_rows, vector_rows in zip(keyword_results, vector_results):
+            fused: Dict[int, float] = {}
+            for ranked_rows in (keyword_rows, vector_rows):
+                for rank, (row, _) in enumerate(ranked_rows, start=1):
+                    fused[row] = fused.get(row, 0.0) + 1.0 / (rank + RRF_CONST)
+            # nlargest keeps the first seen order of ties, like a stable sort
+            results.append(heapq.nlargest(top_k, fused.items(), key=lambda item: item[1]))
+        return results
+
+    def search_raw_docs(self, queries: List[str], query_type: str, top_k: int, query_vectors: Optional[List[List[float]]] = None,
+                        nprobe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Same as search, with the results as raw documents of the common_index_lookup tool."""
+        return [
+            [to_raw_doc(self.documents[row], score) for row, score in query_results]
+            for query_results in self.search(queries, query_type, top_k, query_vectors=query_vectors, nprobe=nprobe)
+        ]
+
+_SEARCH_INDEXES: Dict[str, LocalSearchIndex] = {}
+_SEARCH_INDEXES_LOCK = threading.Lock()
+
+def get_search_index(path: str) -> LocalSearchIndex:
+    """Returns the process-wide search index saved at path, loading it on first use."""
+    key = os.path.realpath(path)
+    index = _SEARCH_INDEXES.get(key)
+    if index is None:
+        with _SEARCH_INDEXES_LOCK:
+            index = _SEARCH_INDEXES.get(key)
+            if index is None:
+                index = _SEARCH_INDEXES[key] = LocalSearchIndex.load(key)
+    return index
@@ -0,0 +1,289 @@
+""" Local vector index over chunk embeddings
+
+An in-process stand-in for the Azure AI Search index queried by the querySearchResource node.
+The embeddings are L2-normalized and saved as a float32 .npy matrix that is memory-mapped on
+load, so a query only reads the pages it touches and forked workers share them. Queries are
+answered by an exhaustive cosine search over blocks of rows or, for large corpora, through an
+optional IVF (inverted file) index: the embeddings are clustered with k-means and a query only
+scans the rows of its nprobe nearest clusters, and of the next nearest ones while those hold fewer
+rows than it asks for.
+
+Results are returned as the raw documents of the common_index_lookup tool, which
+flowUtils.transform_raw_retrieval_doc and chunk_documents_core consume unchanged.
+
+Classes:
+    IVFIndex: Inverted file index over the rows of an embedding matrix
+    LocalVectorIndex: Memory-mapped vector index with the documents of its rows
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ragcore.lazy import LazyModule
+
+np = LazyModule("numpy")
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+MANIFEST_FILE = "index.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+# Fields of the index documents returned as metadata, as mapped in the field_mapping of the
+# querySearchResource node. The content is returned as the text of the raw document.
+DOCUMENT_FIELDS = ("id", "title", "url", "filepath", "meta_json_string")
+CONTENT_FIELD = "content"
+EMBEDDING_FIELD = "contentVector"
+
+# Rows scored at once by the exhaustive search, bounds the scores held in memory
+SEARCH_BLOCK_ROWS = 65536
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Returns the rows of matrix scaled to unit length as float32. All-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def cosine_to_search_score(similarity: float) -> float:
+    """Converts a cosine similarity to the @search.score Azure AI Search reports for cosine
+    vector queries, 1 / (1 + cosine distance)."""
+    return 1.0 / (2.0 - similarity)
+
+def save_documents(path: str, documents: List[Dict[str, Any]]) -> None:
+    """Writes the documents of an index as json lines, one per row."""
+    with open(os.path.join(path, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+        for document in documents:
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+
+def load_documents(path: str) -> List[Dict[str, Any]]:
+    with open(os.path.join(path, DOCUMENTS_FILE), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def to_raw_doc(document: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """A document in the shape of the common_index_lookup tool results, with score as its
+    @search.score."""
+    metadata = {field: document.get(field, "") for field in DOCUMENT_FIELDS}
+    metadata["@search.score"] = score
+    return {"text": document.get(CONTENT_FIELD, ""), "score": score, "metadata": metadata}
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, highest first and equal scores in position order."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+class IVFIndex(object):
+    """Inverted file index: the rows of an embedding matrix grouped by their nearest k-means
+    centroid. The rows of cluster i are order[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> IVFIndex:
+        """Clusters normalized embeddings with spherical k-means.
+        @param embeddings: L2-normalized embedding matrix
+        @param nlist: Number of clusters, defaults to the square root of the number of rows
+        @param iterations: Number of k-means iterations
+        @param seed: Seed of the centroid initialization and of the training sample
+        """
+        num_rows = len(embeddings)
+        nlist = max(1, min(nlist or int(np.sqrt(num_rows)), num_rows))
+        rng = np.random.default_rng(seed)
+        # centroids are trained on a sample, as k-means converges long before it saw every row
+        sample_size = min(num_rows, 256 * nlist)
+        sample = np.asarray(embeddings[np.sort(rng.choice(num_rows, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            # clusters that lost all their rows are reseeded with random rows
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        labels = np.concatenate([
+            np.argmax(np.asarray(embeddings[start:start + SEARCH_BLOCK_ROWS]) @ centroids.T, axis=1)
+            for start in range(0, num_rows, SEARCH_BLOCK_ROWS)
+        ])
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def candidates(self, query_vector: np.ndarray, nprobe: int, min_rows: int = 0) -> np.ndarray:
+        """Sorted rows of the nprobe clusters nearest to a normalized query vector. Further clusters
+        are probed, nearest first, until the candidates hold at least min_rows rows (or all of them)."""
+        clusters = np.argsort(-(self.centroids @ query_vector), kind="stable")
+        covered = np.cumsum(np.diff(self.offsets)[clusters])
+        num_probes = max(min(nprobe, self.nlist), int(np.searchsorted(covered, min_rows)) + 1)
+        probes = clusters[:min(num_probes, self.nlist)]
+        return np.sort(np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probes]))
+
+    def save(self, path: str) -> None:
+        np.save(os.path.join(path, IVF_CENTROIDS_FILE), self.centroids)
+        np.save(os.path.join(path, IVF_ORDER_FILE), self.order)
+        np.save(os.path.join(path, IVF_OFFSETS_FILE), self.offsets)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> IVFIndex:
+        mmap_mode = "r" if mmap else None
+        return cls(
+            np.load(os.path.join(path, IVF_CENTROIDS_FILE)),
+            np.load(os.path.join(path, IVF_ORDER_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, IVF_OFFSETS_FILE))
+        )
+
+class LocalVectorIndex(object):
+    """Vector index over the embeddings of a set of documents, with the documents themselves.
+
+    Usage:
+        index = LocalVectorIndex.from_documents(docs, ivf_nlist=256)
+        index.save("index-travel")
+        results = LocalVectorIndex.load("index-travel").search_raw_docs(query_vectors, top_k=5)
+
+    The documents have the fields of the Azure AI Search index documents, i.e. id, content,
+    title, url, filepath and contentVector.
+    """
+
+    def __init__(self, embeddings: np.ndarray, documents: List[Dict[str, Any]], ivf: Optional[IVFIndex] = None, nprobe: int = 8):
+        """
+        @param embeddings: L2-normalized float32 embedding matrix, one row per document
+        @param documents: Documents of the rows, without their embedding
+        @param ivf: Optional IVF index over the embeddings
+        @param nprobe: Default number of IVF clusters scanned per query
+        """
+        if len(embeddings) != len(documents):
+            raise ValueError(f"{len(embeddings)} embeddings for {len(documents)} documents")
+        self.embeddings = embeddings
+        self.documents = documents
+        self.ivf = ivf
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @property
+    def dimension(self) -> int:
+        return self.embeddings.shape[1]
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]], embedding_field: str = EMBEDDING_FIELD,
+                       ivf_nlist: Optional[int] = None, nprobe: int = 8) -> LocalVectorIndex:
+        """Builds an index from documents carrying their embedding.
+        @param documents: Index documents, e.g. the output of create_docs_from_csv
+        @param embedding_field: Field holding the embedding of a document
+        @param ivf_nlist: Number of IVF clusters, no IVF index is built if not given
+        @param nprobe: Default number of IVF clusters scanned per query
+        """
+        embeddings = []
+        stored_documents = []
+        for document in documents:
+            embeddings.append(document[embedding_field])
+            stored_documents.append({field: value for field, value in document.items() if field != embedding_field})
+        if not stored_documents:
+            raise ValueError("No documents to index")
+        embeddings = normalize_rows(np.array(embeddings, dtype=np.float32))
+        ivf = IVFIndex.build(embeddings, nlist=ivf_nlist) if ivf_nlist else None
+        return cls(embeddings, stored_documents, ivf=ivf, nprobe=nprobe)
+
+    def save(self, path: str) -> None:
+        """Saves the index to a directory, which is created if needed."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, EMBEDDINGS_FILE), np.asarray(self.embeddings, dtype=np.float32))
+        save_documents(path, self.documents)
+        if self.ivf is not None:
+            self.ivf.save(path)
+        manifest = {"count": len(self), "dimension": self.dimension, "ivf_nlist": self.ivf.nlist if self.ivf else None, "nprobe": self.nprobe}
+        with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> LocalVectorIndex:
+        """Loads an index saved with save.
+        @param path: Directory of the index
+        @param mmap: If true, the embedding matrix is memory-mapped read-only instead of read
+        """
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        documents = load_documents(path)
+        ivf = IVFIndex.load(path, mmap=mmap) if manifest.get("ivf_nlist") else None
+        return cls(embeddings, documents, ivf=ivf, nprobe=manifest.get("nprobe", 8))
+
+    def search(self, query_vectors: List[List[float]], top_k: int, nprobe: Optional[int] = None,
+               exhaustive: bool = False) -> List[List[Tuple[int, float]]]:
+        """Finds the rows most similar to each query vector.
+        @param query_vectors: Query embeddings, of the same model and dimension as the index
+        @param top_k: Number of rows per query
+        @param nprobe: Number of IVF clusters scanned per query, defaults to the index's nprobe
+        @param exhaustive: If true, every row is scored even if the index has an IVF index
+        @returns Per query, (row, cosine similarity) tuples, most similar first
+        """
+        if len(query_vectors) == 0:
+            return []
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        if queries.shape[1] != self.dimension:
+            raise ValueError(f"Query vectors of dimension {queries.shape[1]} for an index of dimension {self.dimension}")
+        if top_k <= 0 or len(self) == 0:
+            return [[] for _ in range(len(queries))]
+        if self.ivf is not None and not exhaustive:
+            return [self._search_ivf(query, top_k, nprobe or self.nprobe) for query in queries]
+        return self._search_exhaustive(queries, top_k)
+
+    def _search_exhaustive(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+        best_rows = [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(len(queries))]
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block_scores = np.asarray(self.embeddings[start:start + SEARCH_BLOCK_ROWS]) @ queries.T
+            for i in range(len(queries)):
+                rows = np.concatenate([best_rows[i], np.arange(start, start + len(block_scores))])
+                scores = np.concatenate([best_scores[i], block_scores[:, i]])
+                top = top_k_rows(scores, top_k)
+                best_rows[i], best_scores[i] = rows[top], scores[top]
+        return [list(zip(rows.tolist(), scores.tolist())) for rows, scores in zip(best_rows, best_scores)]
+
+    def _search_ivf(self, query: np.ndarray, top_k: int, nprobe: int) -> List[Tuple[int, float]]:
+        # as Azure AI Search, return top_k rows whenever the index has them, however few nprobe clusters hold
+        rows = self.ivf.candidates(query, nprobe, min_rows=top_k)
+        scores = np.asarray(self.embeddings[rows]) @ query
+        top = top_k_rows(scores, top_k)
+        return list(zip(rows[top].tolist(), scores[top].tolist()))
+
+    def raw_doc(self, row: int, similarity: float) -> Dict[str, Any]:
+        """The raw document of a row in the shape of the common_index_lookup tool results."""
+        return to_raw_doc(self.documents[row], cosine_to_search_score(similarity))
+
+    def search_raw_docs(self, query_vectors: List[List[float]], top_k: int, nprobe: Optional[int] = None,
+                        exhaustive: bool = False) -> List[List[Dict[str, Any]]]:
+        """Same as search, with the results as raw documents of the common_index_lookup tool."""
+        return [
+            [self.raw_doc(row, similarity) for row, similarity in query_results]
+            for query_results in self.search(query_vectors, top_k, nprobe=nprobe, exhaustive=exhaustive)
+        ]
+
+_INDEXES: Dict[str, LocalVectorIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+def get_index(path: str) -> LocalVectorIndex:
+    """Returns the process-wide index saved at path, loading it on first use."""
+    key = os.path.realpath(path)
+    index = _INDEXES.get(key)
+    if index is None:
+        with _INDEXES_LOCK:
+            index = _INDEXES.get(key)
+            if index is None:
+                index = _INDEXES[key] = LocalVectorIndex.load(key)
+    return index
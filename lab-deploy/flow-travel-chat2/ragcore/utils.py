@@ -1,15 +1,24 @@
-import tiktoken
-from bs4 import BeautifulSoup, Comment
+from __future__ import annotations
+import functools
+import hashlib
 import json
 import re
 import os
-from typing import List, Optional, Union
-from langdetect import detect
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from difflib import SequenceMatcher
+from ragcore.lazy import LazyModule
+
+# imported on first use, most nodes never need them
+tiktoken = LazyModule("tiktoken")
+np = LazyModule("numpy")
+bs4 = LazyModule("bs4")
+bs4_builder = LazyModule("bs4.builder")
+scipy_sparse = LazyModule("scipy.sparse")
+langdetect_factory = LazyModule("langdetect.detector_factory")
+sklearn_text = LazyModule("sklearn.feature_extraction.text")
 
-tokenizer = tiktoken.get_encoding('gpt2')
 SENTENCE_ENDINGS = ["\.", "!", "\?"]
 WORDS_BREAKS = list(reversed([",", ";", ":", " ", "\(", "\)", "\[", "\]", "\{", "\}", "\t", "\n"]))
 
@@ -26,83 +35,185 @@ data_source_map = {
   'Cosmos': 'cosmos',
 }
 
-# Load stop words.
-All_STOP_WORDS = {}
-local_dir = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(local_dir, "stopwords.jsonl"), encoding="utf-8") as f:
-    lines = f.readlines()
-    for line in lines:
-        item = json.loads(line, strict=False)
-        All_STOP_WORDS[item["lang"]] = item["stopwords"]
+STOP_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords.jsonl")
+
+@functools.lru_cache(maxsize=None)
+def get_stop_words() -> Dict[str, List[str]]:
+    """Stop word lists by language, loaded from stopwords.jsonl on first use."""
+    all_stop_words = {}
+    with open(STOP_WORDS_PATH, encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line, strict=False)
+            all_stop_words[item["lang"]] = item["stopwords"]
+    return all_stop_words
+
+def __getattr__(name: str):
+    # module attributes that used to be built at import time
+    if name == "tokenizer":
+        return TokenEstimator.GPT2_TOKENIZER
+    if name == "All_STOP_WORDS":
+        return get_stop_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# borrow from https://stackoverflow.com/questions/16861/sanitising-user-input-using-python
+RE_SCRIPTS = re.compile(
+    '(%s)|(%s)' % (r'[\s]*(&#x.{1,7})?'.join(list('javascript:')), r'[\s]*(&#x.{1,7})?'.join(list('vbscript:'))),
+    re.IGNORECASE)
+CITATION_VALID_TAGS = frozenset('p i strong b u a h1 h2 h3 pre br img button'.split())
+CITATION_VALID_ATTRS = frozenset('href src width height'.split())
+HTML_WHITESPACE = ' \t\n\r\x0c'
+
+class CitationSanitizer(object):
+    """Removes scripts, comments, unknown tags and attributes from citation content.
+
+    Results are kept in an LRU cache keyed by a hash of the content, as the same chunks are
+    cited again across turns. Content without any markup is returned as is, which is what the
+    parser would render for it.
+
+    parser can be set to any BeautifulSoup tree builder that is installed, e.g. "lxml". lxml
+    renders the same output for well formed markup, but repairs invalid nesting such as <p>
+    inside <p> and drops stray "<" the way browsers do, so html.parser stays the default.
+    Content with leading whitespace, carriage returns, processing instructions or CDATA
+    sections is always parsed with html.parser, as lxml would drop or normalize those.
+    """
+    DEFAULT_MAX_ENTRIES = 4096
+    _RE_HTML_PARSER_ONLY = re.compile(r'\r|<\?|<!\[', re.IGNORECASE)
+
+    def __init__(self, parser: str = "html.parser", max_entries: int = DEFAULT_MAX_ENTRIES):
+        # fail early, a missing parser would otherwise leave every citation unsanitized.
+        # html.parser ships with Python, checking it would import bs4 on every cold start.
+        if parser != "html.parser" and bs4_builder.builder_registry.lookup(parser) is None:
+            raise ValueError(f"HTML parser {parser} is not available")
+        self.parser = parser
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sanitize(self, content: str) -> str:
+        if not self._has_markup(content):
+            return content
+        key = hashlib.blake2b(content.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            sanitized = self._entries.get(key)
+            if sanitized is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return sanitized
+            self.misses += 1
+        sanitized = self._sanitize(content)
+        with self._lock:
+            self._entries[key] = sanitized
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return sanitized
+
+    def sanitize_many(self, contents: List[str]) -> List[str]:
+        """Sanitizes all citations of a reply, parsing each distinct content once."""
+        sanitized: Dict[str, str] = {}
+        for content in contents:
+            if content not in sanitized:
+                sanitized[content] = self.sanitize(content)
+        return [sanitized[content] for content in contents]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    @staticmethod
+    def _has_markup(content: str) -> bool:
+        # the parser escapes <, > and & and collapses whitespace only documents
+        return '<' in content or '>' in content or '&' in content or (content != '' and content.strip(HTML_WHITESPACE) == '')
+
+    def _sanitize(self, content: str) -> str:
+        try:
+            parser = self.parser
+            if parser != "html.parser" and (content[:1] in HTML_WHITESPACE or self._RE_HTML_PARSER_ONLY.search(content)):
+                parser = "html.parser"
+            soup = bs4.BeautifulSoup(content, features=parser)
+            for comment in soup.findAll(string=lambda text: isinstance(text, bs4.Comment)):
+                # Get rid of comments
+                comment.extract()
+            for tag in soup.findAll(True):
+                if tag.name not in CITATION_VALID_TAGS:
+                    tag.hidden = True
+                attrs = tag.attrs
+                tag.attrs = {}
+                if not attrs:
+                    continue
+                if isinstance(attrs, dict):
+                    attrs = attrs.items()
+                    for attr, val in attrs:
+                        if attr in CITATION_VALID_ATTRS:
+                            val = RE_SCRIPTS.sub('', val) # Remove scripts (vbs & js)
+                            tag.attrs[attr] = val
+                elif isinstance(attrs, list):
+                    for attr in attrs:
+                        if attr in CITATION_VALID_ATTRS:
+                            val = RE_SCRIPTS.sub('', attr)
+                            tag.attrs[attr] = val
+
+            return soup.renderContents().decode('utf8')
+        except Exception as e:
+            return content
+
+CITATION_SANITIZER = CitationSanitizer()
 
 def sanitize_citation_content(content: str) -> str:
-    try:
-        # borrow from https://stackoverflow.com/questions/16861/sanitising-user-input-using-python
-        rjs = r'[\s]*(&#x.{1,7})?'.join(list('javascript:'))
-        rvb = r'[\s]*(&#x.{1,7})?'.join(list('vbscript:'))
-        re_scripts = re.compile('(%s)|(%s)' % (rjs, rvb), re.IGNORECASE)
-        validTags = 'p i strong b u a h1 h2 h3 pre br img button'.split()
-        validAttrs = 'href src width height'.split()
-        soup = BeautifulSoup(content, features="html.parser")
-        for comment in soup.findAll(string=lambda text: isinstance(text, Comment)):
-            # Get rid of comments
-            comment.extract()
-        for tag in soup.findAll(True):
-            if tag.name not in validTags:
-                tag.hidden = True
-            attrs = tag.attrs
-            tag.attrs = {}
-            if not attrs:
-                continue
-            if isinstance(attrs, dict):
-                attrs = attrs.items()
-                for attr, val in attrs:
-                    if attr in validAttrs:
-                        val = re_scripts.sub('', val) # Remove scripts (vbs & js)
-                        tag.attrs[attr] = val
-            elif isinstance(attrs, list):
-                for attr in attrs:
-                    if attr in validAttrs:
-                        val = re_scripts.sub('', attr)
-                        tag.attrs[attr] = val
-
-        return soup.renderContents().decode('utf8')
-    except Exception as e:
-        return content
+    return CITATION_SANITIZER.sanitize(content)
+
+def sanitize_citation_contents(contents: List[str]) -> List[str]:
+    return CITATION_SANITIZER.sanitize_many(contents)
 
 def clip_text(text: str, max_tokens: int) -> str:
-    return tokenizer.decode(tokenizer.encode(text, allowed_special='all')[:max_tokens])
+    encoding = TokenEstimator.GPT2_TOKENIZER
+    return encoding.decode(encoding.encode(text, allowed_special='all')[:max_tokens])
+
+RE_JSON_TERMINATORS = re.compile(r'[{}\[\]"]')
 
 def make_valid_json(text: str) -> str:
     # Verify matching terminators.
     stack = []
-    pos = 0
-    while pos < len(text):
-        char = text[pos]
+    match = RE_JSON_TERMINATORS.search(text)
+    while match:
+        char = match.group()
+        pos = match.end()
         if char == '{':
             stack.append('}')
         elif char == '[':
             stack.append(']')
         elif char == '"':
             stack.append('"')
+            # Skip to the closing quote of the string.
+            pos = text.find('"', pos)
+            while pos != -1 and text[pos - 1] == '\\':
+                pos = text.find('"', pos + 1)
+            if pos == -1:
+                break
+            stack.pop()
             pos = pos + 1
-            while pos < len(text):
-                if text[pos] == '"' and text[pos - 1] != '\\':
-                    stack.pop()
-                    break
-                pos = pos + 1
         elif stack and char == stack[-1]:
             stack.pop()
-        pos = pos + 1
-    
+        match = RE_JSON_TERMINATORS.search(text, pos)
+
     # Verify doesn't end with a backslash.
     if text and text[-1] == '\\':
         text = text[:-1]
-    
+
     # Add missing terminators.
-    for char in reversed(stack):
-        text = text + char
-    return text
+    return text + "".join(reversed(stack))
 
 def strip_quotes_symmetric(text):
     while text.startswith(("'", '"')) and text.endswith(("'", '"')) and len(text) >= 2:
@@ -128,25 +239,7 @@ def convert_string_to_list(list_string: str) -> List[str]:
     return string_list
 
 def get_conversation_text(history: List, max_tokens: int, max_turn_tokens: int, max_turns: int = 0) -> str:
-  conversation = ''
-  turns = 0
-  estimator = TokenEstimator()
-  for turn in reversed(history):
-    reply_content = clip_text(turn['outputs']['reply'], max_turn_tokens)
-    reply_text = f'assistant:\n{reply_content}\n\n'
-    max_tokens -= estimator.estimate_tokens(text=reply_text)
-    turns = turns + 1
-    if max_tokens <= 0 or (turns > max_turns and max_turns > 0):
-      break
-    conversation = reply_text + conversation
-    query_content = clip_text(turn['inputs']['query'], max_turn_tokens)
-    query_text = f'user:\n{query_content}\n\n'
-    max_tokens -= estimator.estimate_tokens(text=query_text)
-    turns = turns + 1
-    if max_tokens <= 0 or (turns > max_turns and max_turns > 0):
-      break
-    conversation = query_text + conversation
-  return conversation.strip()
+  return CONVERSATION_PACKER.pack(history, max_tokens, max_turn_tokens, max_turns)
 
 def cleanup_content(content: str) -> str:
     output = re.sub(r"\n{2,}", "\n", content)
@@ -158,67 +251,171 @@ def get_tfidf_sim_scores(
         query: str,
         document_list: List[str],
         min_reply_chars: int = 0,
-        ngram: int = 2
+        ngram: int = 2,
+        sequence_similarity: str = "sequence_match"
 ) -> List[float]:
-    if not document_list:
-        return []
-    if not query:
-        return [0.0]*len(document_list)
-
-    query_lang = lang_detector(query)
-    doc_langs = set([lang_detector(doc) for doc in document_list])
-
-    if query_lang is None or len(doc_langs) != 1 or query_lang not in doc_langs:
-        return [1.0]*len(document_list) # return high scores by default
-
-    if (query.count(" ") > min_reply_chars) and (query_lang not in ['zh', 'ja', 'ko', 'th', 'vi']):
-        if query_lang not in All_STOP_WORDS:
-            query_lang = "en"
-        if ngram == 1:
-            vocabulary = set(query.split())
-        else:
-            tmp_vectorizer = TfidfVectorizer(
-                decode_error='ignore',
-                analyzer='word',
-                stop_words=All_STOP_WORDS[query_lang],
-                ngram_range=(1, ngram))
-            try:
-                tmp_vectorizer.fit_transform([query])
-            except ValueError:
-                return [1.0]*len(document_list) # return high scores if all words in query are stopwords
-            vocabulary = tmp_vectorizer.get_feature_names_out()
+    return get_tfidf_sim_scores_batch(
+        [query], [document_list], min_reply_chars=min_reply_chars, ngram=ngram, sequence_similarity=sequence_similarity)[0]
 
-        vectorizer = TfidfVectorizer(
+def get_tfidf_sim_scores_batch(
+        queries: List[str],
+        document_lists: List[List[str]],
+        min_reply_chars: int = 0,
+        ngram: int = 2,
+        sequence_similarity: str = "sequence_match"
+) -> List[List[float]]:
+    """Scores each query against its own document list, like calling get_tfidf_sim_scores for each
+    (query, document list) pair. Queries scored with TF-IDF are grouped by language and scored
+    together against their distinct documents with a single TfidfReranker call.
+
+    Short queries and queries in languages without word separators are scored on characters
+    instead. sequence_similarity selects how: "sequence_match" (difflib based sequence_match_ratio,
+    which the filter thresholds are tuned for) or "char_ngram" (CharNgramSimilarity, linear in the
+    text length, whose scores only loosely follow sequence_match_ratio)."""
+    if sequence_similarity not in SEQUENCE_SIMILARITY_METHODS:
+        raise ValueError(f"Unknown sequence similarity method {sequence_similarity}, expected one of {SEQUENCE_SIMILARITY_METHODS}")
+    all_scores: List[Optional[List[float]]] = [None] * len(queries)
+    tfidf_queries: Dict[str, List[int]] = {}
+    # queries of a turn are mostly ranked against the same chunks, detect each language once
+    doc_langs_cache: Dict[str, Optional[str]] = {}
+
+    for i, (query, document_list) in enumerate(zip(queries, document_lists)):
+        if not document_list:
+            all_scores[i] = []
+            continue
+        if not query:
+            all_scores[i] = [0.0]*len(document_list)
+            continue
+
+        query_lang = lang_detector(query)
+        doc_langs = set()
+        for doc in document_list:
+            if doc not in doc_langs_cache:
+                doc_langs_cache[doc] = lang_detector(doc)
+            doc_langs.add(doc_langs_cache[doc])
+
+        if query_lang is None or len(doc_langs) != 1 or query_lang not in doc_langs:
+            all_scores[i] = [1.0]*len(document_list) # return high scores by default
+            continue
+
+        if (query.count(" ") > min_reply_chars) and (query_lang not in ['zh', 'ja', 'ko', 'th', 'vi']):
+            if query_lang not in get_stop_words():
+                query_lang = "en"
+            tfidf_queries.setdefault(query_lang, []).append(i)
+        else:
+            query = clean_stopwords(query, query_lang)
+            docs_cleaned = [clean_stopwords(doc, query_lang) for doc in document_list]
+            if sequence_similarity == "char_ngram":
+                all_scores[i] = CHAR_NGRAM_SIMILARITY.score(query, docs_cleaned).tolist()
+                continue
+            sim_scores = []
+            for doc_cleaned in docs_cleaned:
+                matching_ratio = sequence_match_ratio(query, doc_cleaned) # add a default buffer score of 0.1 to reduce filtered docs
+                sim_scores.append(matching_ratio)
+            all_scores[i] = sim_scores
+
+    for lang, query_indexes in tfidf_queries.items():
+        # score every query of this language against the distinct documents of all of them
+        documents: Dict[str, int] = {}
+        query_documents = [
+            [documents.setdefault(doc, len(documents)) for doc in document_lists[i]] for i in query_indexes
+        ]
+        reranker = get_tfidf_reranker(lang, ngram)
+        score_matrix = reranker.score([queries[i] for i in query_indexes], list(documents), query_documents)
+        for row, (i, doc_indexes) in enumerate(zip(query_indexes, query_documents)):
+            all_scores[i] = score_matrix[row, doc_indexes].tolist()
+    return all_scores
+
+class TfidfReranker(object):
+    """TF-IDF cosine similarity of queries against documents, for one language.
+
+    The stop-word list and the analyzer are resolved once when the reranker is created. Scores
+    match what get_tfidf_sim_scores used to compute with a TfidfVectorizer per query: the
+    vocabulary is the query's own terms and the idf is fit on the query's documents plus the
+    query. As every term of a query's vocabulary occurs in the query, all queries can share one
+    count matrix over the distinct documents, and the similarities of all queries are obtained
+    with two sparse matrix products.
+    """
+    def __init__(self, lang: str, ngram: int = 2):
+        all_stop_words = get_stop_words()
+        if lang not in all_stop_words:
+            lang = "en"
+        self.lang = lang
+        self.ngram = ngram
+        self._analyzer = sklearn_text.TfidfVectorizer(
             decode_error='ignore',
             analyzer='word',
-            stop_words=All_STOP_WORDS[query_lang],
-            ngram_range=(1, ngram),
-            vocabulary=vocabulary
-        )
-        doc_sentences = document_list + [query]
-        # Compute TF-IDF vectors for all sentences
-        tfidf_matrix = vectorizer.fit_transform(doc_sentences)
-        # Compute cosine similarity between the small string and all document sentences
-        similarities = cosine_similarity(tfidf_matrix[-1:], tfidf_matrix[:-1])
-        return similarities[0].tolist()
-    else:
-        query = clean_stopwords(query, query_lang)
-        sim_scores = []
-        for doc in document_list:
-            doc_cleaned = clean_stopwords(doc, query_lang)
-            matching_ratio = sequence_match_ratio(query, doc_cleaned) # add a default buffer score of 0.1 to reduce filtered docs
-            sim_scores.append(matching_ratio)
-        return sim_scores
+            stop_words=all_stop_words[lang],
+            ngram_range=(1, ngram)).build_analyzer()
+
+    def query_terms(self, query: str) -> List[str]:
+        terms = self._analyzer(query)
+        if self.ngram == 1:
+            # unigram vocabularies are the whitespace separated words of the query, as they are,
+            # so only the words the analyzer keeps unchanged (lowercase, no punctuation) are terms
+            words = set(query.split())
+            terms = [term for term in terms if term in words]
+        return terms
+
+    def score(self, queries: List[str], documents: List[str], query_documents: Optional[List[List[int]]] = None) -> np.ndarray:
+        """Returns the len(queries) x len(documents) similarity matrix.
+        @param query_documents: indexes of the documents each query is ranked against, used to fit
+                                that query's idf. Defaults to all documents for every query.
+        """
+        num_queries, num_docs = len(queries), len(documents)
+        vocabulary: Dict[str, int] = {}
+        rows, cols, counts = [], [], []
+        for row, query in enumerate(queries):
+            for term, count in Counter(self.query_terms(query)).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+        # queries made only of stop words get high scores by default. A unigram vocabulary is never
+        # empty though, a query none of whose words is a term matches no document and scores 0
+        scores = np.full((num_queries, num_docs), 0.0 if self.ngram == 1 else 1.0)
+        if not vocabulary or not num_docs:
+            return scores
+        rows, cols, counts = np.array(rows), np.array(cols), np.array(counts, dtype=float)
+
+        doc_counts = sklearn_text.CountVectorizer(analyzer=self._analyzer, vocabulary=vocabulary).transform(documents).astype(float)
+        if query_documents is None:
+            membership = scipy_sparse.csr_matrix(np.ones((num_queries, num_docs)))
+        else:
+            membership_rows = [row for row, doc_indexes in enumerate(query_documents) for _ in doc_indexes]
+            membership_cols = [doc for doc_indexes in query_documents for doc in doc_indexes]
+            membership = scipy_sparse.csr_matrix(
+                (np.ones(len(membership_cols)), (membership_rows, membership_cols)), shape=(num_queries, num_docs))
+        num_query_docs = np.asarray(membership.sum(axis=1)).ravel()
+        doc_freq = (membership @ (doc_counts > 0).astype(float)).tocsr()
+
+        # smooth idf over the query's documents and the query itself, which contains every vocabulary term
+        idf = np.log((2 + num_query_docs[rows]) / (2 + np.asarray(doc_freq[rows, cols]).ravel())) + 1
+        weights = counts * idf
+        query_norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=num_queries))
+        shape = (num_queries, len(vocabulary))
+        numerator = scipy_sparse.csr_matrix((weights * idf / query_norms[rows], (rows, cols)), shape=shape) @ doc_counts.T
+        doc_norms = np.sqrt((scipy_sparse.csr_matrix((idf ** 2, (rows, cols)), shape=shape) @ doc_counts.power(2).T).toarray())
+        numerator = numerator.toarray()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similarities = np.where(doc_norms > 0, numerator / doc_norms, 0.0)
+        has_terms = np.bincount(rows, minlength=num_queries) > 0
+        scores[has_terms] = similarities[has_terms]
+        return scores
+
+_TFIDF_RERANKERS: Dict[Tuple[str, int], TfidfReranker] = {}
+_TFIDF_RERANKERS_LOCK = threading.Lock()
+
+def get_tfidf_reranker(lang: str, ngram: int = 2) -> TfidfReranker:
+    """Returns the process-wide reranker for a language, creating it on first use."""
+    key = (lang, ngram)
+    reranker = _TFIDF_RERANKERS.get(key)
+    if reranker is None:
+        with _TFIDF_RERANKERS_LOCK:
+            reranker = _TFIDF_RERANKERS.setdefault(key, TfidfReranker(lang, ngram))
+    return reranker
 
 def lang_detector(text: str) -> Optional[str]:
-    MAX_CHAR_FOR_DETECTION = 500
-    text_for_detection = text[:MAX_CHAR_FOR_DETECTION]
-    try:
-        lang = detect(text_for_detection)
-    except Exception as e:
-        print(f"Error in detecting language: {e} - Setting it as None")
-        return None
-    return lang
+    return LANGUAGE_DETECTOR.detect(text)
 
 def clean_stopwords(s: str, detectedLang: str="") -> str:
     non_space_separated_langs = ['zh', 'ja', 'ko', 'th', 'vi']
@@ -226,8 +423,9 @@ def clean_stopwords(s: str, detectedLang: str="") -> str:
         s_arr = s.split()
     else:
         s_arr = list(s)
-    if detectedLang in All_STOP_WORDS:
-        s_cleaned = [w for w in s_arr if w not in All_STOP_WORDS[detectedLang]]
+    all_stop_words = get_stop_words()
+    if detectedLang in all_stop_words:
+        s_cleaned = [w for w in s_arr if w not in all_stop_words[detectedLang]]
         if detectedLang not in non_space_separated_langs:
             return " ".join(s_cleaned)
         else:
@@ -253,6 +451,73 @@ def sequence_match_ratio(s1, s2):
     # Return ratio
     return match_length / shorter_length
 
+SEQUENCE_SIMILARITY_METHODS = ("sequence_match", "char_ngram")
+
+class CharNgramSimilarity(object):
+    """Linear time alternative to sequence_match_ratio.
+
+    Texts are turned into hashed character n-gram count vectors and the score is the n-gram
+    overlap relative to the shorter text, sum(min(q, d)) / min(|q|, |d|), which is on the same
+    scale as sequence_match_ratio (1.0 when the query is contained in the document). N-grams
+    are hashed with numpy straight from the code points, without building n-gram strings, and
+    the overlap is computed for all documents at once on a sparse document x query n-gram count
+    matrix, built with a feature index -> query n-gram lookup table.
+    """
+    _HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+    _CODE_POINTS = 0x110000
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 2), n_features_bits: int = 18):
+        self.ngram_range = ngram_range
+        self.n_features = 2 ** n_features_bits
+        self._hash_shift = 64 - n_features_bits
+
+    def hash_ngrams(self, text: str) -> np.ndarray:
+        """Returns the hashed feature index of every character n-gram of text."""
+        code_points = np.frombuffer(text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32).astype(np.uint64)
+        min_n, max_n = self.ngram_range
+        # uint64 scalars keep the arithmetic in uint64
+        hash_multiplier, num_code_points = np.uint64(self._HASH_MULTIPLIER), np.uint64(self._CODE_POINTS)
+        hash_shift = np.uint64(self._hash_shift)
+        hashes = []
+        ngram_ids = code_points
+        for n in range(1, max_n + 1):
+            if n > 1:
+                # uint64 arithmetic wraps around, which is fine for hashing
+                ngram_ids = ngram_ids[:-1] * num_code_points + code_points[n - 1:]
+            if n >= min_n and len(ngram_ids):
+                hashes.append(((ngram_ids + np.uint64(n)) * hash_multiplier) >> hash_shift)
+        if not hashes:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(hashes).astype(np.int64)
+
+    def score(self, query: str, documents: List[str]) -> np.ndarray:
+        scores = np.ones(len(documents))
+        query_hashes = self.hash_ngrams(query)
+        if not len(query_hashes) or not documents:
+            return scores
+        query_columns, query_counts = np.unique(query_hashes, return_counts=True)
+        doc_hashes = [self.hash_ngrams(doc) for doc in documents]
+        doc_totals = np.array([len(hashes) for hashes in doc_hashes])
+        rows = np.repeat(np.arange(len(documents)), doc_totals)
+        all_hashes = np.concatenate(doc_hashes)
+
+        # sparse document x query n-gram counts, only n-grams of the query are kept
+        query_positions = np.full(self.n_features, -1, dtype=np.int32)
+        query_positions[query_columns] = np.arange(len(query_columns))
+        positions = query_positions[all_hashes]
+        matched = positions >= 0
+        doc_counts = scipy_sparse.csr_matrix(
+            (np.ones(int(matched.sum())), (rows[matched], positions[matched])),
+            shape=(len(documents), len(query_columns)))
+        overlap = np.minimum(doc_counts.toarray(), query_counts).sum(axis=1)
+
+        shorter_totals = np.minimum(len(query_hashes), doc_totals)
+        non_empty = doc_totals > 0
+        scores[non_empty] = overlap[non_empty] / shorter_totals[non_empty]
+        return scores
+
+CHAR_NGRAM_SIMILARITY = CharNgramSimilarity()
+
 def extract_intents_from_str_array(str_array: str) -> List[str]:
     intents = []
     i = 0
@@ -311,29 +576,421 @@ def convert_escaped_to_posix(escaped_path):
     posix_path = windows_path.replace("\\", "/")
     return posix_path
 
+class TokenCountCache(object):
+    """Process-wide LRU cache of token counts.
+
+    Entries are keyed by (encoding name, content hash) so the cache never holds on to the
+    original strings. The cache is bounded by an approximate byte budget and is safe to
+    share between threads.
+    """
+    # Approximate cost of one entry: 16 byte digest, encoding name, int value and the
+    # OrderedDict/tuple bookkeeping around them.
+    ENTRY_SIZE_BYTES = 200
+    DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._entries: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, encoding_name: str) -> Tuple[str, bytes]:
+        digest = hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+        return (encoding_name, digest)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the byte budget, evicting least recently used entries if needed."""
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[int]:
+        with self._lock:
+            count = self._entries.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def put(self, key: Tuple[str, bytes], count: int) -> None:
+        with self._lock:
+            self._entries[key] = count
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get_many(self, keys: List[Tuple[str, bytes]]) -> List[Optional[int]]:
+        """Like get for every key, taking the lock once."""
+        counts: List[Optional[int]] = []
+        with self._lock:
+            for key in keys:
+                count = self._entries.get(key)
+                if count is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                counts.append(count)
+        return counts
+
+    def put_many(self, items: Iterable[Tuple[Tuple[str, bytes], int]]) -> None:
+        with self._lock:
+            for key, count in items:
+                self._entries[key] = count
+                self._entries.move_to_end(key)
+            self._evict()
+
+    def count(self, text: str, encoding: tiktoken.Encoding, **encode_kwargs) -> int:
+        """Returns the number of tokens of text, encoding it only on a cache miss."""
+        key = self.make_key(text, encoding.name)
+        count = self.get(key)
+        if count is None:
+            count = len(encoding.encode(text, **encode_kwargs))
+            self.put(key, count)
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": len(self._entries) * self.ENTRY_SIZE_BYTES,
+                "max_bytes": self._max_bytes,
+            }
+
+    def _evict(self) -> None:
+        max_entries = max(0, self._max_bytes // self.ENTRY_SIZE_BYTES)
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+TOKEN_COUNT_CACHE = TokenCountCache()
+
+class TokenizerRegistry(object):
+    """Process-wide registry of tiktoken encodings.
+
+    Every encoding is built once per process and shared by all callers, i.e. TokenEstimator,
+    ConversationPacker and the chunkers. Encodings are built on first use. Servers that run
+    several worker processes can call warmup() in the parent process before forking, so the
+    workers share the BPE tables of the parent copy-on-write instead of each building their
+    own, or in each worker before it accepts traffic, to keep the first requests fast.
+    """
+    DEFAULT_ENCODINGS = ("gpt2", "cl100k_base")
+    # below this many strings, a thread pool costs more than it saves
+    MIN_BATCH_SIZE_FOR_THREADS = 64
+
+    def __init__(self, num_threads: Optional[int] = None):
+        self.num_threads = num_threads or min(8, os.cpu_count() or 1)
+        self._encodings: Dict[str, tiktoken.Encoding] = {}
+        self._lock = threading.Lock()
+
+    def get(self, encoding_name: str) -> tiktoken.Encoding:
+        encoding = self._encodings.get(encoding_name)
+        if encoding is None:
+            with self._lock:
+                encoding = self._encodings.get(encoding_name)
+                if encoding is None:
+                    encoding = self._encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+        return encoding
+
+    def warmup(self, encoding_names: Tuple[str, ...] = DEFAULT_ENCODINGS) -> None:
+        """Builds the encodings and runs them once, so that no request pays for it."""
+        for encoding_name in encoding_names:
+            self.get(encoding_name).encode("warmup", allowed_special="all")
+
+    def loaded(self) -> List[str]:
+        return list(self._encodings)
+
+    def encode_many(self, texts: List[str], encoding_name: str = "gpt2", **encode_kwargs) -> List[List[int]]:
+        """Token ids of every text, encoded on a thread pool for large batches."""
+        encoding = self.get(encoding_name)
+        if self.num_threads > 1 and len(texts) >= self.MIN_BATCH_SIZE_FOR_THREADS:
+            return encoding.encode_batch(texts, num_threads=self.num_threads, **encode_kwargs)
+        return [encoding.encode(text, **encode_kwargs) for text in texts]
+
+    def count_many(self, texts: List[str], encoding_name: str = "gpt2", cache: Optional[TokenCountCache] = None, **encode_kwargs) -> List[int]:
+        """Number of tokens of every text. With a cache, only texts missing from it are encoded."""
+        if cache is None:
+            return [len(token_ids) for token_ids in self.encode_many(texts, encoding_name, **encode_kwargs)]
+        keys = [cache.make_key(text, encoding_name) for text in texts]
+        counts = cache.get_many(keys)
+        missing: Dict[Tuple[str, bytes], List[int]] = {}
+        for i, count in enumerate(counts):
+            if count is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            missing_texts = [texts[indexes[0]] for indexes in missing.values()]
+            missing_counts = [len(token_ids) for token_ids in self.encode_many(missing_texts, encoding_name, **encode_kwargs)]
+            cache.put_many(zip(missing, missing_counts))
+            for indexes, count in zip(missing.values(), missing_counts):
+                for i in indexes:
+                    counts[i] = count
+        return counts
+
+TOKENIZERS = TokenizerRegistry()
+
+def warmup_tokenizers(encoding_names: Tuple[str, ...] = TokenizerRegistry.DEFAULT_ENCODINGS) -> None:
+    TOKENIZERS.warmup(encoding_names)
+
+class LazyEncoding(object):
+    """Class attribute that resolves to an encoding of the TOKENIZERS registry on access."""
+    def __init__(self, encoding_name: str):
+        self.encoding_name = encoding_name
+
+    def __get__(self, instance, owner) -> tiktoken.Encoding:
+        return TOKENIZERS.get(self.encoding_name)
+
 class TokenEstimator(object):
-    GPT2_TOKENIZER = tiktoken.get_encoding("gpt2")
-    CHATGPT_TOKENIZER = tiktoken.get_encoding("cl100k_base")
+    GPT2_TOKENIZER = LazyEncoding("gpt2")
+    CHATGPT_TOKENIZER = LazyEncoding("cl100k_base")
+    cache = TOKEN_COUNT_CACHE
 
     def estimate_tokens(self, text: Union[str, List]) -> int:
         if isinstance(text, str):
-            return len(self.GPT2_TOKENIZER.encode(text, allowed_special="all"))
+            return self.cache.count(text, self.GPT2_TOKENIZER, allowed_special="all")
         else:
             # https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
             tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
             tokens_per_name = -1    # if there's a name, the role is omitted
             num_tokens = 0
+            values = []
             for message in text:
                 num_tokens += tokens_per_message
                 for key, value in message.items():
-                    num_tokens += len(self.CHATGPT_TOKENIZER.encode(value))
+                    values.append(value)
                     if key == "name":
                         num_tokens += tokens_per_name
+            num_tokens += sum(TOKENIZERS.count_many(values, self.CHATGPT_TOKENIZER.name, cache=self.cache))
             num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
             return num_tokens
 
+    def count_tokens_batch(self, texts: List[str]) -> np.ndarray:
+        """Token counts of many texts, same as estimate_tokens for each, encoded in one batch."""
+        return np.array(TOKENIZERS.count_many(texts, self.GPT2_TOKENIZER.name, cache=self.cache, allowed_special="all"), dtype=np.int64)
+
     def construct_tokens_with_size(self, tokens: str, numofTokens: int) -> str:
         newTokens = self.GPT2_TOKENIZER.decode(
             self.GPT2_TOKENIZER.encode(tokens, allowed_special="all")[:numofTokens]
         )
-        return newTokens
\ No newline at end of file
+        return newTokens
+
+def estimate_tokens(text: Union[str, List]) -> int:
+    return TokenEstimator().estimate_tokens(text)
+
+def count_tokens_batch(texts: List[str]) -> np.ndarray:
+    return TokenEstimator().count_tokens_batch(texts)
+
+class LanguageDetector(object):
+    """Deterministic, cached language identification.
+
+    langdetect profiles are loaded once into a detector factory with a fixed seed, so the
+    same text is always detected as the same language. Results are kept in an LRU cache keyed
+    by a hash of the text, as the same chunks are detected again for every query and turn.
+    Pure ASCII text whose words are mostly the stop words of a single language is classified
+    from the stop word lists without running langdetect at all.
+    """
+    MAX_CHAR_FOR_DETECTION = 500
+    DEFAULT_MAX_ENTRIES = 100000
+    # Stop word fast path: enough words, a high share of stop words of the best language and
+    # a clear lead over the runner-up language.
+    FAST_PATH_MIN_WORDS = 8
+    FAST_PATH_MIN_RATIO = 0.25
+    FAST_PATH_MIN_LEAD = 2.0
+    _WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+    def __init__(self, seed: int = 0, max_entries: int = DEFAULT_MAX_ENTRIES, use_fast_path: bool = True):
+        self.seed = seed
+        self.max_entries = max_entries
+        self.use_fast_path = use_fast_path
+        self._factory: Optional[langdetect_factory.DetectorFactory] = None
+        self._stop_word_langs: Optional[Dict[str, Tuple[str, ...]]] = None
+        self._entries: "OrderedDict[bytes, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fast_path_hits = 0
+
+    def detect(self, text: str) -> Optional[str]:
+        text_for_detection = text[:self.MAX_CHAR_FOR_DETECTION]
+        key = hashlib.blake2b(text_for_detection.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        lang = self._detect_stop_words(text_for_detection) if self.use_fast_path else None
+        fast_path_hit = lang is not None
+        if lang is None:
+            try:
+                detector = self._get_factory().create()
+                detector.append(text_for_detection)
+                lang = detector.detect()
+            except Exception as e:
+                print(f"Error in detecting language: {e} - Setting it as None")
+                lang = None
+
+        with self._lock:
+            if fast_path_hit:
+                self.fast_path_hits += 1
+            self._entries[key] = lang
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return lang
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.fast_path_hits = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "fast_path_hits": self.fast_path_hits,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    def _get_factory(self) -> langdetect_factory.DetectorFactory:
+        if self._factory is None:
+            with self._lock:
+                if self._factory is None:
+                    factory = langdetect_factory.DetectorFactory()
+                    factory.load_profile(langdetect_factory.PROFILES_DIRECTORY)
+                    factory.set_seed(self.seed)
+                    self._factory = factory
+        return self._factory
+
+    def _get_stop_word_langs(self) -> Dict[str, Tuple[str, ...]]:
+        """Maps every ASCII stop word to the languages langdetect can return that list it."""
+        if self._stop_word_langs is None:
+            supported_langs = set(self._get_factory().get_lang_list())
+            stop_word_langs: Dict[str, List[str]] = {}
+            for lang, stop_words in get_stop_words().items():
+                if lang not in supported_langs:
+                    continue
+                for word in set(stop_words):
+                    if word.isascii():
+                        stop_word_langs.setdefault(word, []).append(lang)
+            self._stop_word_langs = {word: tuple(langs) for word, langs in stop_word_langs.items()}
+        return self._stop_word_langs
+
+    def _detect_stop_words(self, text: str) -> Optional[str]:
+        if not text.isascii():
+            return None
+        words = self._WORD_RE.findall(text.lower())
+        if len(words) < self.FAST_PATH_MIN_WORDS:
+            return None
+        stop_word_langs = self._get_stop_word_langs()
+        lang_counts: Counter = Counter()
+        for word in words:
+            lang_counts.update(stop_word_langs.get(word, ()))
+        if not lang_counts:
+            return None
+        ranked = lang_counts.most_common(2)
+        best_lang, best_count = ranked[0]
+        runner_up_count = ranked[1][1] if len(ranked) > 1 else 0
+        if best_count < self.FAST_PATH_MIN_RATIO * len(words) or best_count < self.FAST_PATH_MIN_LEAD * runner_up_count:
+            return None
+        return best_lang
+
+LANGUAGE_DETECTOR = LanguageDetector()
+
+class ConversationPacker(object):
+    """Packs the most recent conversation turns into a token budget.
+
+    Every message of a turn is rendered as a "role:\ncontent\n\n" block with its content clipped
+    to max_turn_tokens. Blocks and their token counts are cached by a hash of the role, the
+    clipping limit and the content, so each message of a chat session is tokenized once instead
+    of on every request. Blocks are rendered newest first and only until the running token
+    total runs out of budget.
+    """
+    DEFAULT_MAX_ENTRIES = 4096
+    encoding = LazyEncoding("gpt2")
+
+    def __init__(self, encoding: Optional[tiktoken.Encoding] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if encoding is not None:
+            self.encoding = encoding
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def pack(self, history: List, max_tokens: int, max_turn_tokens: int, max_turns: int = 0) -> str:
+        blocks = []
+        total_tokens = 0
+        for role, content in self._iter_messages(history):
+            if max_turns > 0 and len(blocks) >= max_turns:
+                break
+            block, block_tokens = self.render(role, content, max_turn_tokens)
+            total_tokens += block_tokens
+            if total_tokens >= max_tokens:
+                break
+            blocks.append(block)
+        return "".join(reversed(blocks)).strip()
+
+    def render(self, role: str, content: str, max_turn_tokens: int) -> Tuple[str, int]:
+        """Returns the block of a message and its token count."""
+        key = hashlib.blake2b(
+            f"{role}\n{max_turn_tokens}\n{content}".encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        token_ids = self.encoding.encode(content, allowed_special="all")
+        if len(token_ids) > max_turn_tokens:
+            content = self.encoding.decode(token_ids[:max_turn_tokens])
+        block = f"{role}:\n{content}\n\n"
+        entry = (block, len(self.encoding.encode(block, allowed_special="all")))
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    @staticmethod
+    def _iter_messages(history: List):
+        # newest first, the reply of a turn comes after its query
+        for turn in reversed(history):
+            yield "assistant", turn['outputs']['reply']
+            yield "user", turn['inputs']['query']
+
+CONVERSATION_PACKER = ConversationPacker()
@@ -19,6 +19,13 @@ ASSET_PATH = pathlib.Path(__file__).parent.resolve() / "assets"
 # Set "./prompty" as the path where Prompties are stored, resolving the absolute path:
 PROMPTY_PATH = pathlib.Path(__file__).parent.resolve() / "prompty"
 
+# Set the SQLite file that caches vector embeddings, keyed by model and text, between runs.
+# An empty EMBEDDINGS_CACHE_PATH disables the cache.
+EMBEDDINGS_CACHE_PATH = os.environ.get(
+    "EMBEDDINGS_CACHE_PATH", str(pathlib.Path(__file__).parent.resolve() / ".cache" / "embeddings.sqlite")
+)
+EMBEDDINGS_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDINGS_CACHE_MAX_ENTRIES", 100_000))
+
 # Configure an root app logger that prints info level logs to stdout
 logger = logging.getLogger("app")
 logger.setLevel(logging.INFO)
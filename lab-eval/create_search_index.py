@@ -1,11 +1,17 @@
 import os
+import asyncio
+import contextlib
+from typing import AsyncIterator, Iterator
 from azure.ai.projects import AIProjectClient
 from azure.ai.projects.models import ConnectionType
 from azure.identity import DefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
-from config import get_logger
+from config import EMBEDDINGS_CACHE_PATH, get_logger
+from embedding_cache import cached_embed_function, get_embedding_cache
+from embedding_pipeline import client_embed_function, embed_records
+from index_writer import IndexWriter
 
 # initialize logging object
 logger = get_logger(__name__)
@@ -19,9 +25,6 @@ project = AIProjectClient.from_connection_string(
     conn_str=os.environ["AIPROJECT_CONNECTION_STRING"], credential=DefaultAzureCredential()
 )
 
-# create a vector embeddings client that will be used to generate vector embeddings
-embeddings = project.inference.get_embeddings_client()
-
 # use the project client to get the default search connection
 search_connection = project.connections.get_default(
     connection_type=ConnectionType.AZURE_AI_SEARCH, include_credentials=True
@@ -131,55 +134,131 @@ def create_index_definition(index_name: str, model: str) -> SearchIndex:
         vector_search=vector_search,
     )
 
-# define a function for indexing a csv file, that adds each row as a document
-# and generates vector embeddings for the specified content_column
-def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dict[str, any]]:
-    products = pd.read_csv(path)
-    items = []
-    for product in products.to_dict("records"):
-        content = product[content_column]
-        id = str(product["id"])
-        title = product["name"]
-        url = f"/products/{title.lower().replace(' ', '-')}"
-        emb = embeddings.embed(input=content, model=model)
-        rec = {
-            "id": id,
-            "content": content,
-            "filepath": f"{title.lower().replace(' ', '-')}",
-            "title": title,
-            "url": url,
-            "contentVector": emb.data[0].embedding,
-        }
-        items.append(rec)
-
-    return items
-
-
-def create_index_from_csv(index_name, csv_file):
-    # If a search index already exists, delete it:
+# read the products of a csv file one chunk of rows at a time, so that large files are never loaded whole
+def iter_products(path: str, chunksize: int = 1000) -> Iterator[dict[str, any]]:
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield from chunk.to_dict("records")
+
+
+def product_to_doc(product: dict[str, any], content_column: str) -> dict[str, any]:
+    title = product["name"]
+    return {
+        "id": str(product["id"]),
+        "content": product[content_column],
+        "filepath": f"{title.lower().replace(' ', '-')}",
+        "title": title,
+        "url": f"/products/{title.lower().replace(' ', '-')}",
+    }
+
+
+# create an async embeddings client, for the project's default connection or for the given endpoint,
+# e.g. a local stub server. The client's own retries are disabled, embed_records retries throttled requests.
+@contextlib.asynccontextmanager
+async def get_async_embeddings_client(endpoint: str = None, key: str = None):
+    from azure.ai.inference.aio import EmbeddingsClient
+
+    if endpoint:
+        async with EmbeddingsClient(endpoint=endpoint, credential=AzureKeyCredential(key or ""), retry_total=0) as client:
+            yield client
+        return
+
+    from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
+    async with AsyncDefaultAzureCredential() as credential:
+        async with AsyncAIProjectClient.from_connection_string(
+            conn_str=os.environ["AIPROJECT_CONNECTION_STRING"], credential=credential
+        ) as async_project:
+            async with await async_project.inference.get_embeddings_client(retry_total=0) as client:
+                yield client
+
+
+# define a function for indexing a csv file, that adds each row as a document and generates vector
+# embeddings for the specified content_column. Batches of documents are yielded as soon as they are
+# embedded, batch_size rows per embeddings request with up to concurrency requests in flight.
+# Rows whose content is in the embedding cache are not sent to the embeddings model again.
+async def iter_docs_from_csv(
+    path: str,
+    content_column: str,
+    model: str,
+    batch_size: int = 16,
+    concurrency: int = 4,
+    embeddings_endpoint: str = None,
+    embeddings_key: str = None,
+    embeddings_cache_path: str = EMBEDDINGS_CACHE_PATH,
+) -> AsyncIterator[list[dict[str, any]]]:
+    docs = (product_to_doc(product, content_column) for product in iter_products(path))
+    cache = get_embedding_cache(embeddings_cache_path)
     try:
-        index_definition = index_client.get_index(index_name)
-        index_client.delete_index(index_name)
-        logger.info(f"🗑️  Found existing index named '{index_name}', and deleted it")
-    except Exception:
-        pass
-
-    # create an empty search index
-    index_definition = create_index_definition(index_name, model=os.environ["EMBEDDINGS_MODEL"])
-    index_client.create_index(index_definition)
-
-    # create documents from the products.csv file, generating vector embeddings for the "description" column
-    docs = create_docs_from_csv(path=csv_file, content_column="description", model=os.environ["EMBEDDINGS_MODEL"])
-
-    # Add the documents to the index using the Azure AI Search client
-    search_client = SearchClient(
-        endpoint=search_connection.endpoint_url,
-        index_name=index_name,
-        credential=AzureKeyCredential(key=search_connection.key),
-    )
+        async with get_async_embeddings_client(embeddings_endpoint, embeddings_key) as client:
+            embed = client_embed_function(client, model)
+            if cache is not None:
+                embed = cached_embed_function(embed, cache, model)
+            async for batch in embed_records(docs, embed, batch_size=batch_size, concurrency=concurrency):
+                yield batch
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def create_docs_from_csv(path: str, content_column: str, model: str, batch_size: int = 16, concurrency: int = 4) -> list[dict[str, any]]:
+    async def collect():
+        return [doc async for batch in iter_docs_from_csv(path, content_column, model, batch_size, concurrency) for doc in batch]
+
+    return asyncio.run(collect())
+
+
+def create_index_from_csv(
+    index_name,
+    csv_file,
+    batch_size=16,
+    concurrency=4,
+    embeddings_endpoint=None,
+    embeddings_key=None,
+    embeddings_cache_path=EMBEDDINGS_CACHE_PATH,
+    incremental=False,
+    upload_concurrency=4,
+):
+    index_names = set(index_client.list_index_names())
+    if incremental and index_name in index_names:
+        # keep the existing index, its documents are merged with the rows of the csv file
+        logger.info(f"🔁 Found existing index named '{index_name}', updating its documents")
+    else:
+        # If a search index already exists, delete it:
+        if index_name in index_names:
+            index_client.delete_index(index_name)
+            logger.info(f"🗑️  Found existing index named '{index_name}', and deleted it")
+
+        # create an empty search index
+        index_definition = create_index_definition(index_name, model=os.environ["EMBEDDINGS_MODEL"])
+        index_client.create_index(index_definition)
 
-    search_client.upload_documents(docs)
-    logger.info(f"➕ Uploaded {len(docs)} documents to '{index_name}' index")
+    # create documents from the products.csv file, generating vector embeddings for the "description" column,
+    # and add them to the index using the Azure AI Search client, in request batches sent as soon as they are full
+    async def upload_docs():
+        async with SearchClient(
+            endpoint=search_connection.endpoint_url,
+            index_name=index_name,
+            credential=AzureKeyCredential(key=search_connection.key),
+        ) as search_client:
+            writer = IndexWriter(search_client, merge=incremental, concurrency=upload_concurrency)
+            return await writer.write(
+                iter_docs_from_csv(
+                    path=csv_file,
+                    content_column="description",
+                    model=os.environ["EMBEDDINGS_MODEL"],
+                    batch_size=batch_size,
+                    concurrency=concurrency,
+                    embeddings_endpoint=embeddings_endpoint,
+                    embeddings_key=embeddings_key,
+                    embeddings_cache_path=embeddings_cache_path,
+                )
+            )
+
+    summary = asyncio.run(upload_docs())
+    logger.info(f"➕ Uploaded {summary.succeeded} documents to '{index_name}' index")
+    if summary.failed:
+        logger.warning(f"⚠️  {len(summary.failed)} documents could not be uploaded")
 
 
 if __name__ == "__main__":
@@ -195,8 +274,47 @@ if __name__ == "__main__":
     parser.add_argument(
         "--csv-file", type=str, help="path to data for creating search index", default="assets/products.csv"
     )
+    parser.add_argument(
+        "--batch-size", type=int, help="number of rows embedded per embeddings request", default=16
+    )
+    parser.add_argument(
+        "--concurrency", type=int, help="number of embeddings requests in flight", default=4
+    )
+    parser.add_argument(
+        "--embeddings-endpoint",
+        type=str,
+        help="embeddings endpoint to use instead of the project's, e.g. a local stub server",
+        default=None,
+    )
+    parser.add_argument(
+        "--embeddings-key", type=str, help="key of the --embeddings-endpoint", default=None
+    )
+    parser.add_argument(
+        "--embeddings-cache",
+        type=str,
+        help="SQLite file caching the embeddings of unchanged rows between runs, empty to disable",
+        default=EMBEDDINGS_CACHE_PATH,
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="merge the rows into the existing index instead of deleting and recreating it",
+    )
+    parser.add_argument(
+        "--upload-concurrency", type=int, help="number of upload requests in flight", default=4
+    )
     args = parser.parse_args()
     index_name = args.index_name
     csv_file = args.csv_file
 
-    create_index_from_csv(index_name, csv_file)
\ No newline at end of file
+    create_index_from_csv(
+        index_name,
+        csv_file,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        embeddings_endpoint=args.embeddings_endpoint,
+        embeddings_key=args.embeddings_key,
+        embeddings_cache_path=args.embeddings_cache,
+        incremental=args.incremental,
+        upload_concurrency=args.upload_concurrency,
+    )
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Optional
+from config import EMBEDDINGS_CACHE_MAX_ENTRIES, EMBEDDINGS_CACHE_PATH, get_logger
+from embedding_pipeline import EmbedFunction
+
+# initialize logging object
+logger = get_logger(__name__)
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def vector_to_blob(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def blob_to_vector(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Persistent embeddings keyed by (model, sha256 of the text), stored as raw float32 blobs in a
+    SQLite file. When more than max_entries embeddings are stored, the least recently used ones are
+    evicted. Safe to share between threads.
+
+    Usage:
+        cache = EmbeddingCache(".cache/embeddings.sqlite")
+        vectors = cache.read_through(model, texts, embed_texts)
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBEDDINGS_CACHE_MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._connection.commit()
+        # upper bound of the number of stored embeddings, so that eviction only runs when it may be needed
+        self._count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """Cached embedding of each text, None for the texts that are not cached."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            # query the distinct hashes in chunks that stay below the SQLite host parameter limit
+            distinct = list(dict.fromkeys(hashes))
+            for start in range(0, len(distinct), 500):
+                chunk = distinct[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                )
+                found.update(rows)
+            if found:
+                now = time.time()
+                with self._connection:
+                    self._connection.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, hash) for hash in found],
+                    )
+        return [blob_to_vector(found[hash]) if hash in found else None for hash in hashes]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        """Stores the embedding of each text, evicting the least recently used ones beyond max_entries."""
+        now = time.time()
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(model, text_hash(text), vector_to_blob(vector), now) for text, vector in zip(texts, vectors)],
+                )
+                self._count += len(texts)
+                if self._count > self.max_entries:
+                    self._connection.execute(
+                        "DELETE FROM embeddings WHERE rowid IN ("
+                        " SELECT rowid FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                    self._count = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def read_through(
+        self, model: str, texts: list[str], embed: Callable[[list[str]], list[list[float]]]
+    ) -> list[list[float]]:
+        """Embeddings of texts, calling embed only with the distinct texts that are not cached yet."""
+        vectors = self.get_many(model, texts)
+        missing = missing_texts(texts, vectors)
+        if missing:
+            vectors = self.fill(model, texts, vectors, missing, embed(missing))
+        return vectors
+
+    def fill(
+        self, model: str, texts: list[str], vectors: list[Optional[list[float]]], missing: list[str], computed: list[list[float]]
+    ) -> list[list[float]]:
+        """Stores the computed embeddings of the missing texts and fills them in the vectors of get_many.
+        The computed embeddings are returned rounded to float32, as they are stored, so that a text
+        gets the same vector whether it was cached or not."""
+        computed = [blob_to_vector(vector_to_blob(vector)) for vector in computed]
+        self.put_many(model, missing, computed)
+        logger.debug(f"🗃️ Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        computed = dict(zip(missing, computed))
+        return [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+
+
+def missing_texts(texts: list[str], vectors: list[Optional[list[float]]]) -> list[str]:
+    """Distinct texts that get_many found no embedding for."""
+    return list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+
+def cached_embed_function(embed: EmbedFunction, cache: EmbeddingCache, model: str) -> EmbedFunction:
+    """Wraps an EmbedFunction so that only the texts missing from the cache are sent to the service.
+    The cache is read and written in a worker thread, so that the SQLite I/O does not block the
+    other requests in flight."""
+
+    async def cached_embed(inputs: list[str]) -> list[list[float]]:
+        vectors = await asyncio.to_thread(cache.get_many, model, inputs)
+        missing = missing_texts(inputs, vectors)
+        if missing:
+            computed = await embed(missing)
+            vectors = await asyncio.to_thread(cache.fill, model, inputs, vectors, missing, computed)
+        return vectors
+
+    return cached_embed
+
+
+class CachedEmbeddingsClient:
+    """Read-through cache in front of a synchronous azure.ai.inference EmbeddingsClient."""
+
+    def __init__(self, client, cache: Optional[EmbeddingCache]):
+        self.client = client
+        self.cache = cache
+
+    def embed_texts(self, model: str, texts: list[str]) -> list[list[float]]:
+        """Embedding of each text, from the cache when there is one."""
+
+        def embed(inputs: list[str]) -> list[list[float]]:
+            response = self.client.embed(model=model, input=inputs)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        if self.cache is None:
+            return embed(texts)
+        return self.cache.read_through(model, texts, embed)
+
+
+def get_embedding_cache(path: Optional[str] = EMBEDDINGS_CACHE_PATH) -> Optional[EmbeddingCache]:
+    """Opens the embedding cache at path, or returns None when caching is disabled by an empty path."""
+    return EmbeddingCache(str(path)) if path else None
@@ -0,0 +1,131 @@
+import asyncio
+import random
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional
+from config import get_logger
+
+# initialize logging object
+logger = get_logger(__name__)
+
+# an async function that embeds a list of inputs, returning one vector per input in input order
+EmbedFunction = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """Yields lists of up to batch_size consecutive items, pulling the items lazily."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def client_embed_function(client, model: str) -> EmbedFunction:
+    """Wraps an async azure.ai.inference EmbeddingsClient into an EmbedFunction."""
+
+    async def embed(inputs: list[str]) -> list[list[float]]:
+        response = await client.embed(input=inputs, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    return embed
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    # azure.core HttpResponseError has a status_code, other clients keep it on their response
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait as requested by the Retry-After header of a throttled response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        if headers.get(name):
+            return float(headers[name]) / 1000
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, initial_backoff: float = 1.0, max_backoff: float = 60.0) -> float:
+    """Exponential backoff with jitter before retry number attempt + 1."""
+    return min(max_backoff, initial_backoff * 2**attempt) * (0.5 + random.random() / 2)
+
+
+async def embed_with_retries(
+    embed: EmbedFunction,
+    inputs: list[str],
+    max_retries: int = 6,
+    initial_backoff: float = 1.0,
+    max_backoff: float = 60.0,
+) -> list[list[float]]:
+    """Embeds a batch of inputs, retrying throttled (429) requests with exponential backoff and jitter,
+    or after the delay the service asked for. Other errors, and the last throttling error, are raised."""
+    for attempt in range(max_retries + 1):
+        try:
+            vectors = await embed(inputs)
+        except Exception as e:
+            if get_status_code(e) != 429 or attempt == max_retries:
+                raise
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt, initial_backoff, max_backoff)
+            logger.info(f"⏳ Embedding request throttled, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
+            continue
+        if len(vectors) != len(inputs):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(inputs)} inputs")
+        return vectors
+
+
+async def embed_records(
+    records: Iterable[dict],
+    embed: EmbedFunction,
+    content_field: str = "content",
+    vector_field: str = "contentVector",
+    batch_size: int = 16,
+    concurrency: int = 4,
+    max_retries: int = 6,
+) -> AsyncIterator[list[dict]]:
+    """Adds the embedding of their content to records, sending batch_size records per request and
+    keeping up to concurrency requests in flight.
+
+    Records are pulled from the iterable only when a request slot is free, and batches are yielded as
+    soon as their request completes, in completion order, so at most concurrency batches are held in
+    memory however large the input is.
+    """
+
+    async def embed_batch(batch: list[dict]) -> list[dict]:
+        vectors = await embed_with_retries(embed, [record[content_field] for record in batch], max_retries=max_retries)
+        for record, vector in zip(batch, vectors):
+            record[vector_field] = vector
+        return batch
+
+    pending = set()
+    ready = []
+    try:
+        for batch in batched(records, batch_size):
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                ready.extend(done)
+                while ready:
+                    yield ready.pop().result()
+            pending.add(asyncio.create_task(embed_batch(batch)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            ready.extend(done)
+            while ready:
+                yield ready.pop().result()
+    finally:
+        # a failed batch, or a consumer that stops early, cancels the requests still in flight
+        for task in pending:
+            task.cancel()
+        # and the errors of the batches that completed alongside are not reported as never retrieved
+        for task in ready:
+            if not task.cancelled():
+                task.exception()
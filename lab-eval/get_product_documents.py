@@ -7,6 +7,7 @@ from azure.identity import DefaultAzureCredential
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from config import PROMPTY_PATH, get_logger
+from embedding_cache import CachedEmbeddingsClient, get_embedding_cache
 
 # initialize logging and tracing objects
 logger = get_logger(__name__)
@@ -20,7 +21,8 @@ project = AIProjectClient.from_connection_string(
 
 # create a vector embeddings client that will be used to generate vector embeddings
 chat = project.inference.get_chat_completions_client()
-embeddings = project.inference.get_embeddings_client()
+# search queries repeat often, so their embeddings are read through a persistent cache
+embeddings = CachedEmbeddingsClient(project.inference.get_embeddings_client(), get_embedding_cache())
 
 # use the project client to get the default search connection
 search_connection = project.connections.get_default(
@@ -60,8 +62,7 @@ def get_product_documents(messages: list, context: dict = None) -> dict:
     logger.debug(f"🧠 Intent mapping: {search_query}")
 
     # generate a vector representation of the search query
-    embedding = embeddings.embed(model=os.environ["EMBEDDINGS_MODEL"], input=search_query)
-    search_vector = embedding.data[0].embedding
+    search_vector = embeddings.embed_texts(model=os.environ["EMBEDDINGS_MODEL"], texts=[search_query])[0]
 
     # search the index for products matching the search query
     vector_query = VectorizedQuery(vector=search_vector, k_nearest_neighbors=top, fields="contentVector")
@@ -0,0 +1,145 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import AsyncIterable
+from config import get_logger
+from embedding_pipeline import backoff_delay, get_retry_after, get_status_code
+
+# initialize logging object
+logger = get_logger(__name__)
+
+# limits of a single indexing request to Azure AI Search
+MAX_BATCH_COUNT = 1000
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+
+# status codes of requests, and of the documents of a partially failed batch, that are worth retrying
+RETRIABLE_STATUS_CODES = {409, 422, 429, 503}
+
+
+# bytes the indexing request adds to each document, its "@search.action" and separator
+DOCUMENT_OVERHEAD_BYTES = len(',"@search.action":"mergeOrUpload"},')
+
+
+def document_size(document: dict[str, any]) -> int:
+    """Size of a document in the JSON body of an indexing request."""
+    return len(json.dumps(document, separators=(",", ":")).encode("utf-8")) + DOCUMENT_OVERHEAD_BYTES
+
+
+@dataclass
+class IndexingSummary:
+    succeeded: int = 0
+    # error of each document that could not be indexed, by key
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+class IndexWriter:
+    """Writes documents to a search index in batches bounded by size and count, keeping up to
+    concurrency batches in flight. Documents that fail in a partially successful batch are retried
+    when their status code is transient, and reported in the IndexingSummary otherwise.
+
+    The client is an azure.search.documents.aio.SearchClient, or any object with the same async
+    upload_documents and merge_or_upload_documents methods returning IndexingResults.
+
+    Usage:
+        async with SearchClient(endpoint, index_name, credential) as client:
+            summary = await IndexWriter(client, merge=True).write(batches)
+    """
+
+    def __init__(
+        self,
+        client,
+        key_field: str = "id",
+        merge: bool = False,
+        max_count: int = MAX_BATCH_COUNT,
+        max_bytes: int = MAX_BATCH_BYTES,
+        concurrency: int = 4,
+        max_retries: int = 5,
+    ):
+        self.client = client
+        self.key_field = key_field
+        # merge_or_upload updates the documents already in the index instead of replacing them
+        self.merge = merge
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def send(self, batch: list[dict[str, any]]) -> list:
+        if self.merge:
+            return await self.client.merge_or_upload_documents(documents=batch)
+        return await self.client.upload_documents(documents=batch)
+
+    async def write_batch(self, batch: list[dict[str, any]]) -> IndexingSummary:
+        """Indexes one batch, retrying the whole request or its failed documents on transient errors."""
+        summary = IndexingSummary()
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = await self.send(batch)
+            except Exception as e:
+                if get_status_code(e) not in RETRIABLE_STATUS_CODES or attempt == self.max_retries:
+                    raise
+                delay = get_retry_after(e)
+                await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+                continue
+
+            documents = {str(document[self.key_field]): document for document in batch}
+            retry = []
+            for result in results:
+                if result.succeeded:
+                    summary.succeeded += 1
+                elif result.status_code in RETRIABLE_STATUS_CODES and attempt < self.max_retries:
+                    retry.append(documents[result.key])
+                else:
+                    summary.failed[result.key] = f"{result.status_code}: {result.error_message}"
+            if not retry:
+                break
+            logger.info(f"⏳ {len(retry)} of {len(batch)} documents not indexed yet, retrying ({attempt + 1}/{self.max_retries})")
+            batch = retry
+            await asyncio.sleep(backoff_delay(attempt))
+        return summary
+
+    async def write(self, batches: AsyncIterable[list[dict[str, any]]]) -> IndexingSummary:
+        """Indexes the documents of batches, e.g. as yielded by embed_records. The documents are
+        regrouped into request batches of at most max_count documents and max_bytes bytes, each sent
+        as soon as it is full. A document larger than max_bytes is sent in a batch of its own."""
+        summary = IndexingSummary()
+        pending = set()
+
+        def collect(done) -> None:
+            # retrieve every error before raising the first one
+            errors = [task.exception() for task in done]
+            for task, error in zip(done, errors):
+                if error is not None:
+                    raise error
+                summary.succeeded += task.result().succeeded
+                summary.failed.update(task.result().failed)
+
+        async def dispatch(batch: list[dict[str, any]]) -> None:
+            nonlocal pending
+            if len(pending) >= self.concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+            pending.add(asyncio.create_task(self.write_batch(batch)))
+
+        try:
+            batch, batch_bytes = [], 0
+            async for documents in batches:
+                for document in documents:
+                    size = document_size(document)
+                    if batch and (len(batch) == self.max_count or batch_bytes + size > self.max_bytes):
+                        await dispatch(batch)
+                        batch, batch_bytes = [], 0
+                    batch.append(document)
+                    batch_bytes += size
+            if batch:
+                await dispatch(batch)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        for key, error in summary.failed.items():
+            logger.warning(f"❌ Document '{key}' was not indexed: {error}")
+        return summary